@@ -2,53 +2,283 @@
 app.py code file.
 '''
 
+import hashlib
+import html
+import math
+import os
+import pandas as pd
 import streamlit as st
 from logger import init
 from utils import (
-    parse_excel,
+    parse_files,
     generate_summary,
-    generate_vcard,
-    is_valid_contact
+    generate_vcf,
+    spool_vcf,
+    export_fingerprint,
+    fingerprint_json,
+    load_previous_export,
+    diff_export,
+    generate_delta_vcf,
+    model_wrapper,
+    phone_normalizer,
+    BULK_PROMPT_PROTOCOL
 )
-from email_utils import send_missing_contacts_email
-import logging
+from prompts import prompt_version
+from phones import regions_version
+import metrics
+from email_utils import queue_missing_contacts_email, email_status, SENT, FAILED
 
-logger = logging.getLogger(__name__)
+# Initialize logger, dropping repeated messages
+logger = init(__name__, dedup=True)
 
-# Clear any existing handlers
-if logger.hasHandlers():
-    logger.handlers.clear()
+# Bounds for the per-upload result cache shared across reruns
+CACHE_MAX_ENTRIES = 16
+CACHE_TTL_SECONDS = 60 * 60
 
-# Initialize logger
-logger = init(__name__)
+# Exports of more contacts than this are streamed to a spooled file
+STREAMING_EXPORT_ROWS = 20000
 
-# Optional: Add DuplicateFilter if still needed
-class DuplicateFilter(logging.Filter):
-    def __init__(self):
-        super().__init__()
-        self.logged_messages = set()
-    def filter(self, record):
-        msg = record.getMessage()
-        if msg in self.logged_messages:
-            return False
-        self.logged_messages.add(msg)
-        return True
+# Rows rendered per page in the contact lists and the data preview
+CONTACTS_PAGE_SIZE = 100
+PREVIEW_PAGE_SIZE = 500
 
-if not any(isinstance(f, DuplicateFilter) for f in logger.filters):
-    logger.addFilter(DuplicateFilter())
+# Most recent queued emails whose status is shown
+EMAIL_STATUS_SHOWN = 3
+
+def upload_cache_key(uploads):
+    '''
+    Build the cache key for a set of uploaded (file name, bytes) pairs.
+    Combines a hash of the file names and bytes with the prompt, protocol and model
+    versions and the phone numbering plans (default region and regions table), so
+    editing prompts.py or phone_regions.json, or switching models, invalidates
+    earlier results.
+    '''
+    digest = hashlib.sha256()
+    for file_name, file_bytes in uploads:
+        digest.update(hashlib.sha256(file_name.encode("utf-8")).digest())
+        digest.update(hashlib.sha256(file_bytes).digest())
+    digest.update(prompt_version().encode("utf-8"))
+    digest.update(BULK_PROMPT_PROTOCOL.encode("utf-8"))
+    digest.update(model_wrapper.API_URL.encode("utf-8"))
+    digest.update(phone_normalizer.default.code.encode("utf-8"))
+    digest.update(regions_version().encode("utf-8"))
+    return digest.hexdigest()
+
+def paginate(frame, key, page_size=CONTACTS_PAGE_SIZE):
+    '''
+    Render a search box and page selector for a frame and return the visible page.
+    The search matches any text column case-insensitively.
+    '''
+    query = st.text_input("Search", key=f"{key}_search", placeholder="Filter by name or phone")
+    if query:
+        matches = pd.Series(False, index=frame.index)
+        for column in frame.columns:
+            matches |= frame[column].astype(str).str.contains(query, case=False, regex=False)
+        frame = frame[matches]
+
+    pages = max(1, math.ceil(len(frame) / page_size))
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    st.caption(f"{len(frame)} entries, page {page} of {pages}")
+    start = (page - 1) * page_size
+    return frame.iloc[start:start + page_size]
+
+def render_contact_list(frame, with_links):
+    '''
+    Render a page of contacts as one HTML list instead of one element per contact.
+    '''
+    if with_links:
+        items = [
+            f"<li><b>{html.escape(name)}</b>: <a href='tel:{html.escape(phone)}'>{html.escape(phone)}</a></li>"
+            for name, phone in zip(frame["name"], frame["phone"])
+        ]
+    else:
+        items = [f"<li><b>{html.escape(name)}</b>: Missing</li>" for name in frame["name"]]
+    st.markdown(f"<ul>{''.join(items)}</ul>", unsafe_allow_html=True)
+
+# The cached stages below are keyed on cache_key only; the leading underscore
+# keeps Streamlit from hashing the (potentially large) bytes and frames again.
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_parse(cache_key, _uploads):
+    '''
+    Parse the uploaded files once per cache key; reruns with the same upload skip the model calls.
+    '''
+    logger.info(f"Result cache miss for upload {cache_key[:12]}, parsing.")
+    return parse_files(_uploads)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_summary(cache_key, _cleaned_df):
+    '''
+    Generate the summary once per cache key.
+    '''
+    return generate_summary(_cleaned_df, as_frames=True)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_vcf(cache_key, _cleaned_df):
+    '''
+    Render the VCF bytes once per cache key.
+    '''
+    return generate_vcf(_cleaned_df)
+
+def release_export_file(export):
+    '''
+    Delete a spooled export file once the cache lets go of it.
+    '''
+    path, _ = export
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+@st.cache_resource(
+    max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False, on_release=release_export_file
+)
+def cached_export_file(cache_key, part_size, _cleaned_df):
+    '''
+    Spool a large or split VCF export to disk once per cache key and part size.
+    Returns the file's path and the number of exported contacts.
+    '''
+    return spool_vcf(_cleaned_df, part_size=part_size)
+
+def export_file_reader(cache_key, part_size, cleaned_df):
+    '''
+    Return a callable opening the spooled export when its download is clicked,
+    spooling it again if the cache has released the file in the meantime.
+    The open file is handed to Streamlit, which reads it into its media storage.
+    '''
+    def open_export():
+        path, _ = cached_export_file(cache_key, part_size, cleaned_df)
+        return open(path, "rb")
+    return open_export
+
+def render_email_status():
+    '''
+    Show the status of the emails this session queued; sending happens in the background.
+    '''
+    pending = False
+    for ticket in st.session_state.get("email_tickets", [])[-EMAIL_STATUS_SHOWN:]:
+        status = email_status(ticket)
+        if status is None:
+            continue
+        if status["state"] == SENT:
+            st.success(status["message"])
+        elif status["state"] == FAILED:
+            st.error(status["message"])
+        else:
+            pending = True
+            st.info(status["message"])
+    if pending:
+        st.button("Refresh Email Status")
+
+def render_metrics_sidebar():
+    '''
+    Show the pipeline metrics in the sidebar, with the Prometheus export as a download.
+    '''
+    with st.sidebar.expander("Pipeline metrics"):
+        rows = metrics.registry.snapshot()
+        if rows:
+            st.dataframe(pd.DataFrame(rows).round(4), hide_index=True, use_container_width=True)
+        else:
+            st.caption("No metrics recorded yet.")
+        st.download_button(
+            label="Download Prometheus metrics",
+            data=metrics.registry.export_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain"
+        )
+        if metrics.METRICS_PORT:
+            st.caption(f"Scrape endpoint: http://127.0.0.1:{metrics.METRICS_PORT}/metrics")
+
+def render_delta_export(cache_key, cleaned_df):
+    '''
+    Compare the export with a previous one and offer only the new or changed cards.
+    The previous export is an uploaded VCF, zip of VCF parts or fingerprint, or else
+    the last other upload of this session.
+    '''
+    fingerprints = st.session_state.setdefault("export_fingerprints", {})
+    with st.expander("Delta Export", expanded=False):
+        previous_file = st.file_uploader(
+            "Previous export (VCF, zip of VCF parts or fingerprint JSON)",
+            type=["vcf", "zip", "json"],
+            key="previous_export"
+        )
+        previous = None
+        if previous_file:
+            try:
+                previous = load_previous_export(previous_file.getvalue())
+            except Exception as e:
+                logger.error(f"Error loading previous export: {e}")
+                st.error("Could not read the previous export.")
+        else:
+            earlier = [fingerprint for key, fingerprint in fingerprints.items() if key != cache_key]
+            if earlier:
+                previous = earlier[-1]
+                st.caption("Comparing with the previous upload of this session.")
+
+        if previous is None:
+            current = export_fingerprint(cleaned_df)
+            st.caption("Upload a previous export to download only the new or changed contacts.")
+        else:
+            diff = diff_export(previous, cleaned_df)
+            current = diff["fingerprint"]
+            col_added, col_changed, col_removed = st.columns(3)
+            col_added.metric(label="Added", value=len(diff["added"]))
+            col_changed.metric(label="Changed", value=len(diff["changed"]))
+            col_removed.metric(label="Removed", value=len(diff["removed"]))
+
+            delta_vcf = generate_delta_vcf(diff)
+            if delta_vcf:
+                st.download_button(
+                    label="Download Delta VCF",
+                    data=delta_vcf,
+                    file_name="contacts_delta.vcf",
+                    mime="text/vcard",
+                    use_container_width=True
+                )
+            else:
+                st.write("No new or changed contacts since the previous export.")
+            if not diff["changed"].empty:
+                st.markdown("**Changed Contacts:**")
+                st.dataframe(paginate(diff["changed"], "changed"), hide_index=True, use_container_width=True)
+            if not diff["removed"].empty:
+                st.markdown("**Removed Contacts:**")
+                st.dataframe(paginate(diff["removed"], "removed"), hide_index=True, use_container_width=True)
+
+        st.download_button(
+            label="Download Export Fingerprint",
+            data=fingerprint_json(current),
+            file_name="contacts.fingerprint.json",
+            mime="application/json",
+            help="A compact record of this export to diff the next upload against."
+        )
+
+    # Keep the most recent uploads last, bounded like the result cache
+    fingerprints.pop(cache_key, None)
+    fingerprints[cache_key] = current
+    while len(fingerprints) > CACHE_MAX_ENTRIES:
+        fingerprints.pop(next(iter(fingerprints)))
 
 def main():
     logger.info("Application started.")
+    metrics.start_http_server()
     st.title("🔮 Excel to VCF Converter with AI Data Cleaning & Summary")
 
-    uploaded_file = st.file_uploader("Upload your Excel file", type=["xlsx", "xls"])
-    if uploaded_file:
-        logger.info("File uploaded successfully.")
+    uploaded_files = st.file_uploader(
+        "Upload your contact lists (Excel, CSV, TSV, Parquet or a zip of them)",
+        type=["xlsx", "xls", "csv", "tsv", "parquet", "zip"],
+        accept_multiple_files=True
+    )
+    if uploaded_files:
+        logger.info(f"{len(uploaded_files)} file(s) uploaded successfully.")
+        uploads = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+        cache_key = upload_cache_key(uploads)
 
         with st.spinner("Parsing Excel file..."):
             try:
-                cleaned_df = parse_excel(uploaded_file)
+                cleaned_df = cached_parse(cache_key, uploads)
                 logger.info(f"Batch processed contacts: {len(cleaned_df)} records.")
+                sources = cleaned_df["source"].nunique()
+                if sources > 1:
+                    st.caption(f"Merged {len(cleaned_df)} contacts from {sources} files.")
             except Exception as e:
                 logger.error(f"Error parsing Excel file: {e}")
                 st.error("Error parsing Excel file.")
@@ -59,7 +289,7 @@ def main():
 
         with st.spinner("Generating summary..."):
             try:
-                summary = generate_summary(cleaned_df)
+                summary = cached_summary(cache_key, cleaned_df)
                 logger.info("Generated summary successfully.")
 
                 # Display metrics in columns
@@ -86,32 +316,31 @@ def main():
                 return
 
         st.subheader("Data Preview")
-        st.dataframe(cleaned_df)
+        st.dataframe(paginate(cleaned_df, "preview", PREVIEW_PAGE_SIZE), use_container_width=True)
         logger.info("Displayed data preview.")
 
-        with st.spinner("Generating VCF file..."):
-            vcf_entries = []
-            used_phone_numbers = set()
-
-            for _, row in cleaned_df.iterrows():
-                name = row["name"]
-                phone = row["phone"]
+        part_size = st.number_input(
+            "Contacts per VCF file (0 for a single file)",
+            min_value=0,
+            step=500,
+            value=0,
+            help="Splits the export into several VCF files bundled in a zip archive."
+        )
 
-                if phone == "Missing" or phone in used_phone_numbers:
-                    continue
-
-                if is_valid_contact(name, phone):
-                    used_phone_numbers.add(phone)
-                    vcard = generate_vcard(name, phone)
-                    vcf_entries.append(vcard)
+        with st.spinner("Generating VCF file..."):
+            if part_size or len(cleaned_df) > STREAMING_EXPORT_ROWS:
+                # Large or split exports are streamed to a file on disk, read only when downloaded
+                _, exported = cached_export_file(cache_key, int(part_size), cleaned_df)
+                vcf_content = export_file_reader(cache_key, int(part_size), cleaned_df) if exported else None
+            else:
+                vcf_content = cached_vcf(cache_key, cleaned_df)
 
-            if vcf_entries:
-                vcf_content = "\n".join(vcf_entries)
+            if vcf_content:
                 st.download_button(
-                    label="Download VCF",
+                    label="Download VCF" if not part_size else "Download VCF Parts (zip)",
                     data=vcf_content,
-                    file_name="contacts.vcf",
-                    mime="text/vcard",
+                    file_name="contacts.vcf" if not part_size else "contacts.zip",
+                    mime="text/vcard" if not part_size else "application/zip",
                     use_container_width=True
                 )
                 logger.info("VCF file generated successfully.")
@@ -119,41 +348,54 @@ def main():
                 st.error("No valid contacts found to generate VCF.")
                 logger.error("No valid contacts found to generate VCF.")
 
+        render_delta_export(cache_key, cleaned_df)
+
         st.write("---")
 
         # Restore expandable sections
         with st.expander("Valid Contacts", expanded=True):
-            if summary["unique_contacts"]:
-                contacts_with_phone = [entry for entry in summary["unique_contacts"] if entry["phone"] != "Missing"]
-                contacts_without_phone = [entry for entry in summary["unique_contacts"] if entry["phone"] == "Missing"]
+            unique_contacts = summary["unique_contacts"]
+            if not unique_contacts.empty:
+                has_phone = unique_contacts["phone"] != "Missing"
+                contacts_with_phone = unique_contacts[has_phone]
+                contacts_without_phone = unique_contacts[~has_phone]
 
                 col_valid, col_missing = st.columns(2)
 
                 with col_valid:
                     st.markdown("**Contacts with Numbers:**")
-                    for entry in contacts_with_phone:
-                        st.markdown(f"- **{entry['name']}**: <a href='tel:{entry['phone']}'>{entry['phone']}</a>", unsafe_allow_html=True)
+                    render_contact_list(paginate(contacts_with_phone, "with_phone"), with_links=True)
 
                 with col_missing:
                     st.markdown("**Contacts without Numbers:**")
-                    for entry in contacts_without_phone:
-                        st.markdown(f"- **{entry['name']}**: Missing", unsafe_allow_html=True)
+                    render_contact_list(paginate(contacts_without_phone, "without_phone"), with_links=False)
 
-                    if contacts_without_phone:
+                    if not contacts_without_phone.empty:
                         if st.button("Email Missing Contacts List"):
-                            missing_names = [entry['name'] for entry in contacts_without_phone]
-                            success, message = send_missing_contacts_email(missing_names)
-                            if success:
-                                st.success(message)
-                            else:
+                            missing_names = contacts_without_phone["name"].tolist()
+                            ticket, message = queue_missing_contacts_email(missing_names)
+                            if ticket is None:
                                 st.error(message)
+                            else:
+                                st.session_state.setdefault("email_tickets", []).append(ticket)
+                        render_email_status()
 
         with st.expander("Duplicate Numbers", expanded=False):
             if summary["duplicate_phone_numbers"]:
-                for phone, info in summary["duplicate_phone_numbers"].items():
-                    st.write(f"**{phone}**")
-                    st.write(f"- First: {info['first_name']}")
-                    st.write(f"- Duplicates: {', '.join(info['duplicates'])}")
+                duplicates = pd.DataFrame(
+                    [
+                        (
+                            phone,
+                            info["first_name"],
+                            info["first_source"],
+                            ", ".join(info["duplicates"]),
+                            ", ".join(dict.fromkeys(info["duplicate_sources"]))
+                        )
+                        for phone, info in summary["duplicate_phone_numbers"].items()
+                    ],
+                    columns=["Phone", "First", "First File", "Duplicates", "Duplicate Files"]
+                )
+                st.dataframe(paginate(duplicates, "duplicates"), hide_index=True, use_container_width=True)
             else:
                 st.write("No duplicate numbers found.")
     st.write("---")
@@ -161,4 +403,6 @@ def main():
 
 if __name__ == "__main__":
     main()
+    # Rendered last so the panel includes this run's stages
+    render_metrics_sidebar()
     logger.info("Application finished execution.")
\ No newline at end of file
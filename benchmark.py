@@ -0,0 +1,426 @@
+'''
+benchmark.py code file.
+'''
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+import utils
+from utils import (
+    standardize_phone,
+    standardize_phones,
+    is_valid_phone,
+    valid_phone_mask,
+    valid_name_mask,
+    is_valid_name,
+    read_contact_chunks,
+    preprocess_excel,
+    process_contacts_bulk,
+    generate_summary,
+    generate_vcf,
+    parse_excel,
+    parse_files
+)
+
+# Raw phone formats seen in manifests, filled with 9 random digits
+PHONE_FORMATS = [
+    "05{}", "905{}", "+905{}", "00905{}", "0905{}", "5{}",
+    "0 5{} ", "(05{})", "+90 5{}", "212{}", "+1 5{}",
+]
+
+# Building blocks of synthetic travel manifests
+FIRST_NAMES = ["AHMET", "MEHMET", "AYSE", "FATMA", "OZGUR", "ZEYNEP", "CAN", "ELIF", "MURAT", "DENIZ"]
+LAST_NAMES = ["YILMAZ", "KAYA", "DEMIR", "AKSOY", "CELIK", "SAHIN", "OZTURKOGLULARINDAN", "ARSLAN"]
+TITLES = ["", "", "", "Mr. ", "Ms. ", "Mrs. "]
+METADATA_NAMES = [
+    "Hilton Garden Inn", "Miami", "Treasure Island Hotel", "Tour Leader Kivanc ONER (MIA&ORL)",
+    "Las Vegas Blvd address", "Airport transfer", "Group booking office", "San Francisco",
+]
+MESSY_NAMES = ["{}  {}", "Dr. {} {}", "{} {} / VIP", "{}, {}"]
+SIZES = (100, 1000, 10000, 100000)
+
+def synthetic_phones(rows, seed=42):
+    '''
+    Generate a Series of raw phone values in mixed formats, including float artifacts.
+    '''
+    rnd = random.Random(seed)
+    values = []
+    for _ in range(rows):
+        digits = str(rnd.randint(100000000, 999999999))
+        if rnd.random() < 0.1:
+            values.append(float("5" + digits))
+        else:
+            values.append(rnd.choice(PHONE_FORMATS).format(digits))
+    return pd.Series(values, dtype=object)
+
+def synthetic_manifest(rows, seed=42):
+    '''
+    Generate a raw travel manifest like the uploaded workbooks.
+    Mixes traveler rows (some with titles) with hotel/city metadata rows, "&"
+    pairs, missing phones, travelers repeated with the same phone and messy
+    rows only the model can clean, next to an unrelated Room column.
+    '''
+    rnd = random.Random(seed)
+    phones = synthetic_phones(rows, seed).astype(str).tolist()
+    names = []
+    for i in range(rows):
+        kind = rnd.random()
+        if kind < 0.05:
+            names.append(rnd.choice(METADATA_NAMES))
+        elif kind < 0.08:
+            names.append(f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)} & {rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}")
+        elif kind < 0.1:
+            names.append(rnd.choice(MESSY_NAMES).format(rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)))
+            if rnd.random() < 0.5:
+                phones[i] = f"{phones[i]} / 0532{rnd.randint(1000000, 9999999)}"
+        elif kind < 0.15 and i:
+            # Same traveler listed again, e.g. once per flight
+            repeat = rnd.randrange(i)
+            names.append(names[repeat])
+            phones[i] = phones[repeat]
+        else:
+            names.append(f"{rnd.choice(TITLES)}{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}")
+        if rnd.random() < 0.03:
+            phones[i] = None
+    return pd.DataFrame({
+        "Names": names,
+        "Phone": phones,
+        "Room": [rnd.randint(100, 999) for _ in range(rows)],
+    })
+
+def write_manifest(frame, folder, file_format):
+    '''
+    Write the manifest in the given format and return its path.
+    Excel files get the two metadata rows the app expects above the header.
+    '''
+    path = os.path.join(folder, f"manifest.{file_format}")
+    if file_format == "xlsx":
+        with pd.ExcelWriter(path) as writer:
+            pd.DataFrame([["Manifest"], [""]]).to_excel(writer, index=False, header=False)
+            frame.to_excel(writer, index=False, startrow=2)
+    elif file_format == "parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, sep="\t" if file_format == "tsv" else ",", index=False)
+    return path
+
+def bench_input_formats(rows, formats=("xlsx", "csv", "tsv", "parquet")):
+    '''
+    Time loading the Names/Phone columns of the same manifest in each input format.
+    Checks that every format yields the same rows and returns rows/s per format.
+    '''
+    manifest = synthetic_manifest(rows)
+    results = {"rows": rows}
+    expected = None
+    with tempfile.TemporaryDirectory() as folder:
+        for file_format in formats:
+            path = write_manifest(manifest, folder, file_format)
+            chunks, elapsed = timed(lambda p: list(read_contact_chunks(p)), path)
+            names = pd.concat(chunks)["Names"].tolist()
+            if expected is None:
+                expected = names
+            elif names != expected:
+                raise AssertionError(f"{file_format} input differs from {formats[0]}")
+            results[f"{file_format}_load_s"] = round(elapsed, 4)
+            results[f"{file_format}_rows_per_s"] = round(rows / elapsed)
+    return results
+
+def stub_completion(system_prompt, content_prompt, **kwargs):
+    '''
+    Deterministic stand-in for the model: keeps the prompt's contacts whose name
+    passes is_valid_name and drops their titles. Answers full-protocol prompts
+    with a JSON array of contacts and compact ones with kept indices and fixes.
+    '''
+    if '"index|name|phone"' in content_prompt:
+        keep, fixes = [], {}
+        for index, name, phone in re.findall(r"^(\d+)\|(.*)\|(.*)$", content_prompt, flags=re.MULTILINE):
+            if is_valid_name(name):
+                keep.append(int(index))
+                cleaned = utils.TITLE_PATTERN.sub("", name).strip()
+                if cleaned != name:
+                    fixes[index] = {"name": cleaned}
+        return json.dumps({"keep": keep, "fix": fixes})
+
+    contacts_data = content_prompt.rsplit("Now, process these contacts:", 1)[-1]
+    contacts = [
+        {"name": utils.TITLE_PATTERN.sub("", name).strip(), "phone": phone}
+        for name, phone in re.findall(r"^Name: (.*), Phone: (.*)$", contacts_data, flags=re.MULTILINE)
+        if is_valid_name(name)
+    ]
+    return json.dumps(contacts)
+
+@contextmanager
+def stub_model(latency=0.0):
+    '''
+    Route the pipeline's model calls to stub_completion for the duration of the block.
+    Each call waits for the shared concurrency budget and then `latency` seconds,
+    like a remote model would. Yields a dict whose "calls" entry counts the model
+    calls made.
+    '''
+    counter = {"calls": 0}
+    lock = threading.Lock()
+
+    def counted_completion(*args, **kwargs):
+        with lock:
+            counter["calls"] += 1
+        if latency:
+            with utils.model_wrapper.concurrency:
+                time.sleep(latency)
+        return stub_completion(*args, **kwargs)
+
+    original = utils.model_wrapper.single_shot_completion
+    utils.model_wrapper.single_shot_completion = counted_completion
+    try:
+        yield counter
+    finally:
+        utils.model_wrapper.single_shot_completion = original
+
+def baseline_standardize_phone(phone):
+    '''
+    The per-row standardizer the phone table replaced, kept verbatim as the baseline:
+    every number is forced into +90 and its last 10 digits.
+    '''
+    phone = str(phone).strip()
+    if phone.endswith('.0'):
+        phone = phone[:-2]
+    phone = re.sub(r'[\s()-]', '', phone)
+
+    if phone.startswith('+90'):
+        standardized = phone
+    elif phone.startswith('0090'):
+        standardized = '+90' + phone[4:]
+    elif phone.startswith('090'):
+        standardized = '+90' + phone[3:]
+    elif phone.startswith('90'):
+        standardized = '+90' + phone[2:]
+    elif phone.startswith('0'):
+        standardized = '+90' + phone[1:]
+    else:
+        standardized = '+90' + phone
+
+    if standardized.startswith('+90'):
+        digits = standardized[3:]
+        digits = digits[-10:]
+        standardized = '+90' + digits
+    return standardized
+
+def timed(func, *args):
+    '''
+    Run func once and return its result with the elapsed wall time in seconds.
+    '''
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def bench_phone_standardization(rows):
+    '''
+    Compare the per-row phone helpers with their Series-level versions, and
+    standardization with the baseline per-row standardizer.
+    Checks that the per-row and Series-level helpers produce identical results
+    and returns the timings, with the share of numbers the baseline standardizes
+    the same way (numbers dialing another country differ on purpose).
+    '''
+    phones = synthetic_phones(rows)
+
+    baseline, baseline_time = timed(lambda values: [baseline_standardize_phone(v) for v in values], phones)
+
+    per_row, per_row_time = timed(lambda values: [standardize_phone(v) for v in values], phones)
+    vectorized, vectorized_time = timed(standardize_phones, phones)
+    if per_row != vectorized.tolist():
+        raise AssertionError("standardize_phones differs from standardize_phone")
+
+    per_row_valid, per_row_valid_time = timed(lambda values: [is_valid_phone(v) for v in values], per_row)
+    mask, mask_time = timed(valid_phone_mask, vectorized)
+    if per_row_valid != mask.tolist():
+        raise AssertionError("valid_phone_mask differs from is_valid_phone")
+
+    normalizer = utils.phone_normalizer
+    per_row_types, per_row_types_time = timed(lambda values: [normalizer.line_type(v) for v in values], per_row)
+    line_types, line_types_time = timed(utils.phone_line_types, vectorized)
+    if per_row_types != line_types.tolist():
+        raise AssertionError("phone_line_types differs from line_type")
+
+    return {
+        "rows": rows,
+        "standardize_baseline_s": round(baseline_time, 4),
+        "standardize_per_row_s": round(per_row_time, 4),
+        "standardize_vectorized_s": round(vectorized_time, 4),
+        "standardize_speedup": round(per_row_time / vectorized_time, 2),
+        "standardize_baseline_speedup": round(baseline_time / vectorized_time, 2),
+        "standardize_baseline_agreement": round(sum(a == b for a, b in zip(baseline, per_row)) / rows, 4),
+        "validate_per_row_s": round(per_row_valid_time, 4),
+        "validate_vectorized_s": round(mask_time, 4),
+        "validate_speedup": round(per_row_valid_time / mask_time, 2),
+        "line_types_per_row_s": round(per_row_types_time, 4),
+        "line_types_vectorized_s": round(line_types_time, 4),
+        "line_types_speedup": round(per_row_types_time / line_types_time, 2),
+    }
+
+def bench_stages(rows, seed=42):
+    '''
+    Time each pipeline stage separately on a synthetic manifest workbook of the given size.
+    The model is replaced by stub_completion and the row memo is bypassed, so
+    the timings and row counts are reproducible between commits.
+    '''
+    manifest = synthetic_manifest(rows, seed)
+    results = {"rows": rows}
+    with tempfile.TemporaryDirectory() as folder:
+        path, results["write_xlsx_s"] = timed(write_manifest, manifest, folder, "xlsx")
+        raw_df, results["preprocess_excel_s"] = timed(preprocess_excel, path)
+
+    _, results["standardize_phones_s"] = timed(standardize_phones, raw_df["Phone"])
+    _, results["name_filter_s"] = timed(valid_name_mask, raw_df["Names"])
+    with stub_model() as model_calls:
+        contacts, results["clean_stub_s"] = timed(lambda df: process_contacts_bulk(df, use_memo=False), raw_df)
+    summary, results["generate_summary_s"] = timed(generate_summary, contacts)
+    vcf_content, results["generate_vcf_s"] = timed(generate_vcf, contacts)
+
+    results = {key: round(value, 4) if key.endswith("_s") else value for key, value in results.items()}
+    results.update({
+        "preprocessed_rows": len(raw_df),
+        "cleaned_contacts": len(contacts),
+        "model_calls": model_calls["calls"],
+        "unique_phone_numbers": summary["unique_phone_numbers"],
+        "vcards": vcf_content.count(b"BEGIN:VCARD"),
+        "preprocess_rows_per_s": round(rows / max(results["preprocess_excel_s"], 1e-9)),
+    })
+    return results
+
+def bench_prompt_protocols(rows, seed=42, protocols=("full", "compact")):
+    '''
+    Compare the full and compact prompt protocols on the same preprocessed manifest.
+    Every row goes to the stub model (no routing, no memo). Reports the requests,
+    estimated input/output tokens and cleaning time per protocol, and checks that
+    both protocols yield the same contacts.
+    '''
+    manifest = synthetic_manifest(rows, seed)
+    with tempfile.TemporaryDirectory() as folder:
+        raw_df = preprocess_excel(write_manifest(manifest, folder, "xlsx"))
+
+    results = {"rows": rows}
+    expected = None
+    for protocol in protocols:
+        utils.reset_token_usage()
+        with stub_model():
+            contacts, elapsed = timed(
+                lambda df: process_contacts_bulk(df, use_memo=False, route=False, protocol=protocol), raw_df
+            )
+        usage = utils.token_usage_report().get(protocol, {})
+        frame = contacts.to_frame()
+        if expected is None:
+            expected = frame
+        elif not frame.equals(expected):
+            raise AssertionError(f"{protocol} protocol yields different contacts than {protocols[0]}")
+        results[protocol] = {
+            "requests": usage.get("requests", 0),
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "clean_s": round(elapsed, 4),
+        }
+    return results
+
+def bench_multi_file(files, rows, latency=0.2, seed=42):
+    '''
+    Compare parsing several manifest workbooks one after another with parse_files.
+    The stub model answers after `latency` seconds and the row memo and response
+    cache are bypassed. Checks that both yield the same contacts and returns the
+    timings.
+    '''
+    with tempfile.TemporaryDirectory() as folder:
+        uploads = []
+        for index in range(files):
+            path = write_manifest(synthetic_manifest(rows, seed + index), folder, "xlsx")
+            with open(path, "rb") as f:
+                uploads.append((f"manifest_{index}.xlsx", f.read()))
+
+    memo, utils.contact_memo = utils.contact_memo, None
+    cache, utils.model_wrapper.cache = utils.model_wrapper.cache, None
+    try:
+        with stub_model(latency):
+            frames, sequential_s = timed(lambda items: [parse_excel(io.BytesIO(data)) for _, data in items], uploads)
+        with stub_model(latency) as model_calls:
+            merged, parallel_s = timed(parse_files, uploads)
+    finally:
+        utils.contact_memo, utils.model_wrapper.cache = memo, cache
+    if not merged[["name", "phone"]].equals(pd.concat(frames, ignore_index=True)):
+        raise AssertionError("parse_files differs from parsing the files one by one")
+
+    summary = generate_summary(merged)
+    return {
+        "files": files,
+        "rows_per_file": rows,
+        "model_latency_s": latency,
+        "model_calls": model_calls["calls"],
+        "sequential_s": round(sequential_s, 4),
+        "parse_files_s": round(parallel_s, 4),
+        "speedup": round(sequential_s / parallel_s, 2),
+        "contacts": len(merged),
+        "cross_file_duplicates": len(summary["duplicate_phone_numbers"]),
+    }
+
+def run_metadata():
+    '''
+    Describe the code and environment the results were measured on.
+    '''
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pyarrow": utils.HAS_PYARROW,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the contact pipeline and report JSON results.")
+    parser.add_argument(
+        "--suite", choices=["stages", "phones", "formats", "protocols", "files", "all"], default="stages",
+        help="Benchmarks to run (default: stages)"
+    )
+    parser.add_argument(
+        "--sizes", default=",".join(map(str, SIZES)),
+        help="Comma-separated manifest sizes for the stage benchmark, up to 1000000"
+    )
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of synthetic phones")
+    parser.add_argument("--input-rows", type=int, default=100_000, help="Number of rows per input format")
+    parser.add_argument("--files", type=int, default=8, help="Number of workbooks for the multi-file benchmark")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = run_metadata()
+    if args.suite in ("stages", "all"):
+        results["stages"] = [bench_stages(int(size)) for size in args.sizes.split(",")]
+    if args.suite in ("phones", "all"):
+        results["phones"] = bench_phone_standardization(args.rows)
+    if args.suite in ("formats", "all"):
+        results["formats"] = bench_input_formats(args.input_rows)
+    if args.suite in ("protocols", "all"):
+        results["protocols"] = bench_prompt_protocols(args.input_rows)
+    if args.suite in ("files", "all"):
+        results["files"] = bench_multi_file(args.files, args.input_rows // args.files)
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+'''
+cache.py code file.
+'''
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from logger import init
+
+logger = init(__name__)
+
+# Define constants directly
+CACHE_FOLDER = os.getenv("CACHE_FOLDER", "cache")
+RESPONSE_CACHE_FILE = "responses.sqlite3"
+RESPONSE_CACHE_MAX_ENTRIES = 5000
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+CONTACT_MEMO_FILE = "contacts.sqlite3"
+CONTACT_MEMO_MAX_ENTRIES = 500000
+
+def make_key(*parts):
+    '''
+    Build a content-addressed cache key from the given parts.
+    '''
+    payload = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SQLiteStore:
+    '''
+    Base class for the versioned SQLite stores below.
+    Opens (and creates) the database file, sets up the table from `schema` and
+    serializes access through a lock so one instance can be shared across threads.
+    Entries are tagged with a version so stale ones can be invalidated.
+    '''
+    table = None
+    schema = None
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({self.schema})")
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_last_access ON {self.table} (last_access)"
+            )
+
+    def invalidate(self, stale_only=True):
+        '''
+        Remove stored entries.
+        With stale_only, only entries written under another version (e.g. before
+        prompts.py changed) are removed; otherwise everything is cleared.
+        Returns the number of removed entries.
+        '''
+        with self._lock, self._conn:
+            if stale_only:
+                cursor = self._conn.execute(f"DELETE FROM {self.table} WHERE version != ?", (self.version,))
+            else:
+                cursor = self._conn.execute(f"DELETE FROM {self.table}")
+        if cursor.rowcount:
+            logger.info(f"Invalidated {cursor.rowcount} entries from {self.path}")
+        return cursor.rowcount
+
+class ResponseCache(SQLiteStore):
+    '''
+    Disk-backed, content-addressed cache of model responses stored in SQLite.
+    Entries are evicted least-recently-used first once the entry count or total
+    size exceeds its bounds. Safe to share across threads and processes.
+    '''
+    table = "responses"
+    schema = (
+        "key TEXT PRIMARY KEY, version TEXT NOT NULL, response TEXT NOT NULL, "
+        "size INTEGER NOT NULL, last_access REAL NOT NULL"
+    )
+
+    def __init__(
+        self,
+        path=None,
+        version="",
+        max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes=RESPONSE_CACHE_MAX_BYTES
+    ):
+        super().__init__(path or os.path.join(CACHE_FOLDER, RESPONSE_CACHE_FILE), version)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def get(self, key):
+        '''
+        Return the cached response for the key, or None on a miss.
+        '''
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND version = ?",
+                (key, self.version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        '''
+        Store a response under the key and evict old entries past the cache bounds.
+        '''
+        size = len(response.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, version, response, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, self.version, response, size, time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} cached responses from {self.path}")
+
+    def stats(self):
+        '''
+        Return hit/miss counters and the current size of the cache.
+        '''
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": count,
+            "bytes": total
+        }
+
+class ContactMemo(SQLiteStore):
+    '''
+    Persistent per-row memo of cleaned contacts.
+    Maps a normalized raw (name, phone) pair to the cleaned (name, phone) the model
+    produced for it, or to a rejected verdict, so unchanged rows of a re-uploaded
+    manifest never go back to the model. Least-recently-used rows are evicted
+    once the memo grows past max_entries.
+    '''
+    table = "contacts"
+    schema = (
+        "key TEXT PRIMARY KEY, version TEXT NOT NULL, name TEXT, phone TEXT, "
+        "rejected INTEGER NOT NULL, last_access REAL NOT NULL"
+    )
+
+    def __init__(self, path=None, version="", max_entries=CONTACT_MEMO_MAX_ENTRIES):
+        super().__init__(path or os.path.join(CACHE_FOLDER, CONTACT_MEMO_FILE), version)
+        self.max_entries = max_entries
+
+    @staticmethod
+    def row_key(raw_name, raw_phone):
+        '''
+        Build the memo key of a raw row from its whitespace-normalized name and phone.
+        '''
+        name = " ".join(str(raw_name).split())
+        phone = "".join(str(raw_phone).split())
+        return make_key(name, phone)
+
+    def get_many(self, keys):
+        '''
+        Look up row keys.
+        Returns a dict of the keys found, mapping to the cleaned (name, phone) tuple
+        or None for rows the model rejected.
+        '''
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock, self._conn:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, name, phone, rejected FROM contacts WHERE version = ? AND key IN ({placeholders})",
+                    [self.version] + batch
+                ).fetchall()
+                for key, name, phone, rejected in rows:
+                    found[key] = None if rejected else (name, phone)
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE contacts SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found]
+            )
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def put_many(self, entries):
+        '''
+        Store (key, contact) pairs, where contact is the cleaned (name, phone) tuple
+        or None for a rejected row.
+        Keys whose rows got different verdicts, such as identical raw rows the model
+        merged into one contact, are not stored: replaying either verdict for every
+        row would not match the model's answer, so those rows go back to the model.
+        '''
+        verdicts = {}
+        conflicting = set()
+        for key, contact in entries:
+            if verdicts.setdefault(key, contact) != contact:
+                conflicting.add(key)
+        now = time.time()
+        values = [
+            (key, self.version, contact[0] if contact else None,
+             contact[1] if contact else None, 0 if contact else 1, now)
+            for key, contact in verdicts.items()
+            if key not in conflicting
+        ]
+        if not values:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO contacts (key, version, name, phone, rejected, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                values
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM contacts WHERE key IN "
+                    "(SELECT key FROM contacts ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+                logger.info(f"Evicted {count - self.max_entries} memoized rows from {self.path}")
+
+    def stats(self):
+        '''
+        Return hit/miss counters and the number of memoized rows.
+        '''
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": count}
@@ -0,0 +1,161 @@
+'''
+cli.py code file.
+'''
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from logger import init
+from utils import (
+    PROCESS_START_METHOD,
+    preprocess_excel,
+    process_contacts_bulk,
+    generate_summary,
+    generate_vcf,
+    model_wrapper
+)
+
+logger = init(__name__)
+
+# Define constants directly
+DEFAULT_PATTERNS = ("*.xlsx", "*.xls", "*.csv", "*.tsv", "*.parquet")
+
+def collect_inputs(inputs):
+    '''
+    Expand the given files, directories and glob patterns into a sorted list of workbooks.
+    Directories are searched (non-recursively) for Excel, CSV, TSV and Parquet files.
+    '''
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in DEFAULT_PATTERNS:
+                paths.update(glob.glob(os.path.join(item, pattern)))
+        elif os.path.isfile(item):
+            paths.add(item)
+        else:
+            paths.update(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    return sorted(paths)
+
+def output_name(path):
+    '''
+    Return the base name of a workbook's output files: its file name, extension included,
+    so that e.g. "manifest.xlsx" and "manifest.csv" do not overwrite each other.
+    '''
+    return os.path.basename(path)
+
+def check_output_names(paths):
+    '''
+    Raise ValueError when several inputs would write the same output files.
+    '''
+    seen = {}
+    clashes = []
+    for path in paths:
+        name = output_name(path)
+        if name in seen:
+            clashes.append(f"{seen[name]} and {path}")
+        seen.setdefault(name, path)
+    if clashes:
+        raise ValueError("inputs with the same file name would overwrite each other's output: " + "; ".join(clashes))
+
+def convert_workbook(path, raw_df, output_dir):
+    '''
+    Clean the preprocessed rows of one workbook and write its VCF and JSON summary.
+    Returns the number of preprocessed rows and exported contacts.
+    '''
+    cleaned_df = process_contacts_bulk(raw_df).to_frame()
+    summary = generate_summary(cleaned_df)
+    vcf_content = generate_vcf(cleaned_df)
+
+    name = output_name(path)
+    with open(os.path.join(output_dir, f"{name}.vcf"), "wb") as f:
+        f.write(vcf_content)
+    with open(os.path.join(output_dir, f"{name}.summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"Converted {path}: {len(raw_df)} rows, {summary['unique_phone_numbers']} unique phones")
+    return len(raw_df), vcf_content.count(b"BEGIN:VCARD")
+
+def run_batch(paths, output_dir, workers=None, file_concurrency=4, model_concurrency=None):
+    '''
+    Convert workbooks in bulk.
+    Workbooks are parsed in a process pool; each parsed workbook is then cleaned
+    on a thread pool, with model calls across all files sharing one concurrency
+    limit. Returns per-run totals including files/s and rows/s.
+    Raises ValueError before converting anything when output names collide.
+    '''
+    check_output_names(paths)
+    os.makedirs(output_dir, exist_ok=True)
+    if model_concurrency:
+        model_wrapper.set_max_concurrency(model_concurrency)
+
+    start = time.perf_counter()
+    totals = {"files": 0, "failed": 0, "rows": 0, "contacts": 0}
+
+    parser_context = multiprocessing.get_context(PROCESS_START_METHOD)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=parser_context) as parsers, \
+            ThreadPoolExecutor(max_workers=file_concurrency) as converters:
+        parse_futures = {parsers.submit(preprocess_excel, path): path for path in paths}
+        convert_futures = {}
+        for future in as_completed(parse_futures):
+            path = parse_futures[future]
+            try:
+                raw_df = future.result()
+            except Exception as e:
+                logger.error(f"Could not parse {path}: {str(e)}")
+                print(f"FAILED {path}: {e}", file=sys.stderr)
+                totals["failed"] += 1
+                continue
+            convert_futures[converters.submit(convert_workbook, path, raw_df, output_dir)] = path
+
+        for future in as_completed(convert_futures):
+            path = convert_futures[future]
+            try:
+                rows, contacts = future.result()
+            except Exception as e:
+                logger.error(f"Could not convert {path}: {str(e)}")
+                print(f"FAILED {path}: {e}", file=sys.stderr)
+                totals["failed"] += 1
+                continue
+            totals["files"] += 1
+            totals["rows"] += rows
+            totals["contacts"] += contacts
+            print(f"OK {path}: {rows} rows, {contacts} contacts")
+
+    elapsed = time.perf_counter() - start
+    totals["seconds"] = round(elapsed, 3)
+    totals["files_per_second"] = round(totals["files"] / elapsed, 3) if elapsed else 0.0
+    totals["rows_per_second"] = round(totals["rows"] / elapsed, 1) if elapsed else 0.0
+    return totals
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert travel manifests to VCF files without the web UI.")
+    parser.add_argument("inputs", nargs="+", help="Workbook files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="output", help="Directory for the <file name>.vcf and <file name>.summary.json files")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--files", type=int, default=4, help="Workbooks cleaned at the same time")
+    parser.add_argument("--model-concurrency", type=int, default=None, help="Model requests in flight across all files")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        parser.error("no workbooks found")
+    try:
+        check_output_names(paths)
+    except ValueError as e:
+        parser.error(str(e))
+
+    totals = run_batch(paths, args.output_dir, args.workers, args.files, args.model_concurrency)
+    print(
+        f"Converted {totals['files']} files ({totals['failed']} failed), {totals['rows']} rows, "
+        f"{totals['contacts']} contacts in {totals['seconds']}s: "
+        f"{totals['files_per_second']} files/s, {totals['rows_per_second']} rows/s"
+    )
+    return 1 if totals["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
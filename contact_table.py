@@ -0,0 +1,116 @@
+'''
+contact_table.py code file.
+'''
+
+import sys
+from array import array
+import numpy as np
+import pandas as pd
+
+# Define constants directly
+STATUS_MODEL = 0    # Cleaned by the model
+STATUS_MEMO = 1     # Resolved from the persistent row memo
+STATUS_MANUAL = 2   # Cleaned by the manual fallback rules
+STATUS_RULES = 3    # Resolved locally by the confidence router
+STATUS_LABELS = {STATUS_MODEL: "model", STATUS_MEMO: "memo", STATUS_MANUAL: "manual", STATUS_RULES: "rules"}
+
+class ContactTable:
+    '''
+    Columnar table of cleaned contacts.
+    Names and phones are kept as two lists of interned strings, the status codes
+    and source row positions as typed arrays, so a contact costs a few pointers
+    and machine integers instead of a dict. Rows can be appended cheaply while
+    cleaning and the table converts to a name/phone DataFrame column by column.
+    '''
+    __slots__ = ("names", "phones", "statuses", "rows")
+
+    def __init__(self, names=None, phones=None, statuses=None, rows=None):
+        self.names = names if names is not None else []
+        self.phones = phones if phones is not None else []
+        self.statuses = statuses if statuses is not None else array("b")
+        self.rows = rows if rows is not None else array("q")
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        '''
+        Iterate over the (name, phone) pairs.
+        '''
+        return zip(self.names, self.phones)
+
+    def append(self, name, phone, status, row):
+        '''
+        Add one contact cleaned from the raw row at the given position.
+        '''
+        self.names.append(sys.intern(name))
+        self.phones.append(sys.intern(phone))
+        self.statuses.append(status)
+        self.rows.append(row)
+
+    def extend(self, other, row_offset=0):
+        '''
+        Append all contacts of another table, shifting their source rows by row_offset.
+        '''
+        self.names.extend(other.names)
+        self.phones.extend(other.phones)
+        self.statuses.extend(other.statuses)
+        if row_offset:
+            self.rows.extend(array("q", (row + row_offset for row in other.rows)))
+        else:
+            self.rows.extend(other.rows)
+        return self
+
+    @classmethod
+    def concat(cls, tables):
+        '''
+        Concatenate tables into a new one.
+        '''
+        result = cls()
+        for table in tables:
+            result.extend(table)
+        return result
+
+    def take(self, indices):
+        '''
+        Return a new table with the contacts at the given positions, in that order.
+        '''
+        return ContactTable(
+            [self.names[i] for i in indices],
+            [self.phones[i] for i in indices],
+            array("b", (self.statuses[i] for i in indices)),
+            array("q", (self.rows[i] for i in indices))
+        )
+
+    def sorted_by_row(self):
+        '''
+        Return the contacts ordered by source row; contacts of one row keep their order.
+        '''
+        order = sorted(range(len(self)), key=self.rows.__getitem__)
+        return self.take(order)
+
+    def first_by_row(self):
+        '''
+        Map each source row position to its first contact as a (name, phone) tuple.
+        '''
+        first = {}
+        for row, name, phone in zip(self.rows, self.names, self.phones):
+            first.setdefault(row, (name, phone))
+        return first
+
+    def to_frame(self, include_meta=False):
+        '''
+        Convert to a DataFrame with "name" and "phone" columns.
+        With include_meta, the "status" labels and "source_row" positions are added,
+        each copied from its typed array in one block rather than element by element
+        (a view would stop the table from growing).
+        '''
+        frame = pd.DataFrame({
+            "name": pd.Series(self.names, dtype=object),
+            "phone": pd.Series(self.phones, dtype=object)
+        })
+        if include_meta:
+            statuses = np.frombuffer(self.statuses, dtype=np.int8).copy() if self.statuses else np.empty(0, np.int8)
+            frame["status"] = pd.Categorical.from_codes(statuses, categories=list(STATUS_LABELS.values()))
+            frame["source_row"] = np.frombuffer(self.rows, dtype=np.int64).copy() if self.rows else np.empty(0, np.int64)
+        return frame
@@ -2,53 +2,284 @@
 email_utils.py code file.
 '''
 
+import itertools
+import os
+import queue
+import random
 import smtplib
+import threading
+import time
+from collections import OrderedDict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from logger import init
+from metrics import EMAILS
 import streamlit as st
 
 logger = init(__name__)
 
-def send_missing_contacts_email(contacts):
+# Define constants directly
+OUTBOX_QUEUE_SIZE = 100        # Emails waiting for the worker before new ones are refused
+OUTBOX_BATCH_SIZE = 20         # Emails sent over one connection check
+OUTBOX_MAX_RETRIES = 3         # Retries after the first attempt
+OUTBOX_STATUS_SIZE = 256       # Recent email statuses kept for the sessions
+BACKOFF_BASE = 1.0             # Seconds, doubled on every retry
+BACKOFF_MAX = 30.0             # Upper bound for a single backoff
+SMTP_TIMEOUT = 30.0            # Seconds for connecting and for each SMTP command
+SMTP_IDLE_SECONDS = 60.0       # Close the connection after this long without emails
+
+# Email states reported back to the session
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+def email_config():
+    '''
+    Read the email configuration from the Streamlit secrets.
+    The SMTP server can be pointed at a local stand-in with SMTP_SERVER and
+    SMTP_PORT, and STARTTLS turned off with SMTP_STARTTLS=0.
+    '''
+    secrets = st.secrets["EMAIL"]
+    return {
+        "sender": secrets["sender"],
+        "password": secrets.get("password"),
+        "recipient": secrets["recipient"],
+        "smtp_server": os.getenv("SMTP_SERVER") or secrets["smtp_server"],
+        "smtp_port": int(os.getenv("SMTP_PORT") or secrets["smtp_port"]),
+        "starttls": os.getenv("SMTP_STARTTLS", "1") != "0",
+    }
+
+def backoff_seconds(attempt):
+    '''
+    Return a full-jitter exponential backoff for the given retry attempt.
+    '''
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def missing_contacts_body(contacts):
+    '''
+    Build the plain-text body listing the contacts with missing phone numbers.
+    The list is joined in one pass, so long lists do not copy the body per name.
+    '''
+    lines = "\n".join(f"- {name}" for name in contacts)
+    return (
+        "The following contacts are missing phone numbers:\n\n"
+        f"{lines}\n"
+        "\nPlease provide phone numbers for these contacts."
+    )
+
+def missing_contacts_message(contacts, config):
+    '''
+    Build the missing contacts email from the sender to the recipient.
+    '''
+    msg = MIMEMultipart()
+    msg['From'] = config["sender"]
+    msg['To'] = config["recipient"]
+    msg['Subject'] = 'Contacts Missing Phone Numbers'
+    msg.attach(MIMEText(missing_contacts_body(contacts), 'plain'))
+    return msg
+
+class Outbox:
+    '''
+    Background sender for emails.
+    Messages are queued and sent by one worker thread over a persistent SMTP
+    connection, which is checked with NOOP before each batch and reopened (with
+    STARTTLS and login) when the server dropped it or after SMTP_IDLE_SECONDS
+    without emails. Failed sends are retried with backoff. Every message gets a
+    ticket whose status callers can poll without blocking.
+    '''
+
+    def __init__(self, config, batch_size=OUTBOX_BATCH_SIZE, max_retries=OUTBOX_MAX_RETRIES):
+        self.config = config
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.statuses = OrderedDict()
+        self._queue = queue.Queue(maxsize=OUTBOX_QUEUE_SIZE)
+        self._tickets = itertools.count(1)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._worker = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._worker.start()
+
+    def submit(self, msg):
+        '''
+        Queue a message and return its ticket.
+        Raises queue.Full when the outbox is backed up.
+        '''
+        ticket = next(self._tickets)
+        self._set_status(ticket, QUEUED, "Email queued.")
+        try:
+            self._queue.put_nowait((ticket, msg))
+        except queue.Full:
+            self._set_status(ticket, FAILED, "Email outbox is full, try again later.")
+            EMAILS.inc(outcome="refused")
+            raise
+        return ticket
+
+    def status(self, ticket):
+        '''
+        Return the status dict ("state", "message", "attempts") of a ticket, or None.
+        '''
+        with self._lock:
+            status = self.statuses.get(ticket)
+            return dict(status) if status else None
+
+    def wait(self, ticket, timeout=None):
+        '''
+        Block until the ticket is sent or failed, or the timeout passes, and return its status.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status(ticket)
+            if status is None or status["state"] in (SENT, FAILED):
+                return status
+            if deadline is not None and time.monotonic() >= deadline:
+                return status
+            time.sleep(0.05)
+
+    def close(self, timeout=None):
+        '''
+        Send the queued emails, then stop the worker and close the connection.
+        '''
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+    def _set_status(self, ticket, state, message, attempts=0):
+        with self._lock:
+            self.statuses[ticket] = {"state": state, "message": message, "attempts": attempts}
+            self.statuses.move_to_end(ticket)
+            while len(self.statuses) > OUTBOX_STATUS_SIZE:
+                self.statuses.popitem(last=False)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=SMTP_IDLE_SECONDS if self._conn else None)
+            except queue.Empty:
+                self._disconnect()
+                continue
+
+            # Take whatever else is already waiting, up to a batch
+            batch = [item]
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            stop = None in batch
+            for entry in batch:
+                if entry is not None:
+                    self._deliver(*entry)
+            if stop:
+                self._disconnect()
+                return
+
+    def _deliver(self, ticket, msg):
+        for attempt in range(self.max_retries + 1):
+            self._set_status(ticket, SENDING, "Sending email...", attempt + 1)
+            try:
+                self._connection().send_message(msg)
+                logger.info(f"Successfully sent email {ticket} to {msg['To']}")
+                EMAILS.inc(outcome="sent")
+                self._set_status(ticket, SENT, "Email sent successfully!", attempt + 1)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                # Drop the connection, a fresh one is opened and authenticated on retry
+                self._disconnect()
+                error = e
+                if attempt == self.max_retries:
+                    break
+                delay = backoff_seconds(attempt)
+                logger.warning(f"Sending email {ticket} failed ({str(e)}), retrying in {delay:.1f}s")
+                EMAILS.inc(outcome="retried")
+                time.sleep(delay)
+
+        error_msg = f"Failed to send email: {str(error)}"
+        logger.error(error_msg)
+        EMAILS.inc(outcome="failed")
+        self._set_status(ticket, FAILED, error_msg, self.max_retries + 1)
+
+    def _connection(self):
+        if self._conn is not None:
+            try:
+                if self._conn.noop()[0] == 250:
+                    return self._conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._disconnect()
+
+        config = self.config
+        conn = smtplib.SMTP(config["smtp_server"], config["smtp_port"], timeout=SMTP_TIMEOUT)
+        try:
+            if config.get("starttls", True):
+                conn.starttls()
+            if config.get("password"):
+                conn.login(config["sender"], config["password"])
+        except Exception:
+            conn.close()
+            raise
+        logger.info(f"Opened SMTP connection to {config['smtp_server']}:{config['smtp_port']}")
+        self._conn = conn
+        return conn
+
+    def _disconnect(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.quit()
+        except (smtplib.SMTPException, OSError):
+            self._conn.close()
+        self._conn = None
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox():
+    '''
+    Return the process-wide outbox, started on first use with email_config().
+    '''
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox(email_config())
+        return _outbox
+
+def queue_missing_contacts_email(contacts):
+    '''
+    Queue an email with the list of contacts that have missing phone numbers.
+    Returns immediately with (ticket, message); the ticket is None when the email
+    could not be queued. Poll the ticket with email_status.
+    '''
+    try:
+        outbox = get_outbox()
+        ticket = outbox.submit(missing_contacts_message(contacts, outbox.config))
+        logger.info(f"Queued missing contacts email {ticket} with {len(contacts)} names")
+        return ticket, "Email queued, it is sent in the background."
+    except queue.Full:
+        return None, "Email outbox is full, try again later."
+    except Exception as e:
+        error_msg = f"Failed to queue email: {str(e)}"
+        logger.error(error_msg)
+        return None, error_msg
+
+def email_status(ticket):
+    '''
+    Return the status dict of a queued email, or None when it is unknown.
+    '''
+    return get_outbox().status(ticket)
+
+def send_missing_contacts_email(contacts, timeout=SMTP_TIMEOUT * (OUTBOX_MAX_RETRIES + 1)):
     """
     Send an email with the list of contacts that have missing phone numbers.
+    Goes through the outbox and waits for the result.
 
     Args:
         contacts: List of contact names with missing phone numbers
     """
-    try:
-        # Get email configuration from Streamlit secrets
-        SENDER_EMAIL = st.secrets["EMAIL"]["sender"]
-        SENDER_PASSWORD = st.secrets["EMAIL"]["password"]
-        RECIPIENT_EMAIL = st.secrets["EMAIL"]["recipient"]
-        SMTP_SERVER = st.secrets["EMAIL"]["smtp_server"]
-        SMTP_PORT = st.secrets["EMAIL"]["smtp_port"]
-
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = RECIPIENT_EMAIL
-        msg['Subject'] = 'Contacts Missing Phone Numbers'
-
-        # Create email body
-        body = "The following contacts are missing phone numbers:\n\n"
-        for name in contacts:
-            body += f"- {name}\n"
-        body += "\nPlease provide phone numbers for these contacts."
-
-        msg.attach(MIMEText(body, 'plain'))
-
-        # Send email
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            server.send_message(msg)
-
-        logger.info(f"Successfully sent missing contacts email to {RECIPIENT_EMAIL}")
-        return True, "Email sent successfully!"
-
-    except Exception as e:
-        error_msg = f"Failed to send email: {str(e)}"
-        logger.error(error_msg)
-        return False, error_msg
\ No newline at end of file
+    ticket, message = queue_missing_contacts_email(contacts)
+    if ticket is None:
+        return False, message
+    status = get_outbox().wait(ticket, timeout)
+    return status["state"] == SENT, status["message"]
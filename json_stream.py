@@ -0,0 +1,140 @@
+'''
+json_stream.py code file.
+'''
+
+import json
+
+class JSONArrayParser:
+    '''
+    Incremental parser for the items of a JSON array that arrives in pieces, such
+    as a model response streamed token by token.
+    Text before the array, and before `marker` when one is given, is skipped.
+    Each item is decoded as soon as the delimiter after it arrives, so items can
+    be used before the response is complete. A malformed item is skipped and its
+    place recorded in `gaps` (the number of well-formed items before it) instead
+    of failing the whole array; `complete` tells whether the array was closed.
+    With members, the container is an object and its items are (key, value) pairs.
+    '''
+
+    def __init__(self, marker=None, members=False):
+        self.marker = marker
+        self.members = members
+        self.opener = "{" if members else "["
+        self.started = False
+        self.complete = False
+        self.items = 0
+        self.gaps = []
+        self._buffer = ""
+        self._pos = 0
+        self._scan = None
+
+    def feed(self, text):
+        '''
+        Add the next piece of text and return the items it completed.
+        '''
+        if self.complete:
+            return []
+        self._buffer += text
+        if not self.started and not self._find_start():
+            return []
+        items = self._drain()
+        # Drop the consumed text so the buffer only holds the current item
+        self._buffer = self._buffer[self._pos:]
+        if self._scan:
+            self._scan[0] -= self._pos
+        self._pos = 0
+        return items
+
+    def _find_start(self):
+        start = 0
+        if self.marker:
+            start = self._buffer.find(self.marker)
+            if start == -1:
+                return False
+            start += len(self.marker)
+        start = self._buffer.find(self.opener, start)
+        if start == -1:
+            return False
+        self.started = True
+        self._pos = start + 1
+        return True
+
+    def _drain(self):
+        items = []
+        buffer = self._buffer
+        while True:
+            if self._scan is None:
+                # Skip separators between items
+                while self._pos < len(buffer) and (buffer[self._pos].isspace() or buffer[self._pos] == ","):
+                    self._pos += 1
+                if self._pos >= len(buffer):
+                    return items
+                if buffer[self._pos] in "]}":
+                    self.complete = True
+                    return items
+                self._scan = [self._pos, 0, False, False]
+
+            end = self._find_item_end()
+            if end == -1:
+                return items
+            self._scan = None
+            text = buffer[self._pos:end]
+            self._pos = end
+            try:
+                if self.members:
+                    member = json.loads("{" + text + "}")
+                    if len(member) != 1:
+                        raise ValueError("Expected a single member")
+                    item = next(iter(member.items()))
+                else:
+                    item = json.loads(text)
+            except ValueError:
+                self.gaps.append(self.items)
+                continue
+            self.items += 1
+            items.append(item)
+
+    def _find_item_end(self):
+        # Resume scanning the current item; returns the index of the comma or
+        # closing bracket after it, or -1 when it has not fully arrived yet
+        buffer = self._buffer
+        i, depth, in_string, escaped = self._scan
+        while i < len(buffer):
+            char = buffer[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            elif char in "]}":
+                if depth == 0:
+                    return i
+                depth -= 1
+            elif char == "," and depth == 0:
+                return i
+            i += 1
+        self._scan = [i, depth, in_string, escaped]
+        return -1
+
+def unresolved_rows(anchors, parser, row_count):
+    '''
+    Return the row indices a partially parsed answer may have skipped.
+    anchors holds, for every well-formed item in order, the index of the row it
+    refers to, or None when unknown. Rows between the anchors around a malformed
+    item, and after the last anchor when the array was cut off, are unresolved.
+    '''
+    gaps = list(parser.gaps)
+    if not parser.complete:
+        gaps.append(len(anchors))
+    unresolved = set()
+    for gap in gaps:
+        before = next((anchor for anchor in reversed(anchors[:gap]) if anchor is not None), -1)
+        after = next((anchor for anchor in anchors[gap:] if anchor is not None), row_count)
+        unresolved.update(range(before + 1, after))
+    return unresolved
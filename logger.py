@@ -1,14 +1,133 @@
 """This module contains the logger initialization function."""
 import os
+import atexit
+import hashlib
+import json
 import logging
+import logging.handlers
 import inspect
+import queue
+import threading
+from collections import OrderedDict
 
 # Define constants directly
-LOG_LEVEL = "INFO"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FOLDER = "logs"
+LOG_QUEUE_SIZE = 10000       # Records waiting for the background writer before new ones are dropped
+LOG_DEDUP_SIZE = 1024        # Recent messages remembered by DuplicateFilter
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "full")  # "full" or "digest" (sizes and hashes only)
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
-def init(name):
-    """Initialize a logger with the given name and returns it."""
+class DuplicateFilter(logging.Filter):
+    """Drops messages identical to one of the last `maxsize` logged messages."""
+
+    def __init__(self, maxsize=LOG_DEDUP_SIZE):
+        super().__init__()
+        self.maxsize = maxsize
+        self.logged_messages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        # Key on the unformatted message and its arguments where possible, so lazy
+        # payloads are not rendered just to be compared
+        try:
+            msg = (record.msg, record.args)
+            hash(msg)
+        except TypeError:
+            msg = record.getMessage()
+        with self._lock:
+            if msg in self.logged_messages:
+                self.logged_messages.move_to_end(msg)
+                return False
+            self.logged_messages[msg] = None
+            if len(self.logged_messages) > self.maxsize:
+                self.logged_messages.popitem(last=False)
+        return True
+
+class Payload:
+    """
+    Lazily rendered log argument for large payloads such as prompts and responses.
+    Pass it as a %-style argument so nothing is rendered unless the record is
+    emitted. Renders the full text, or only its size and hash when LOG_PAYLOADS
+    is "digest".
+    """
+    __slots__ = ("value", "as_json")
+
+    def __init__(self, value, as_json=False):
+        self.value = value
+        self.as_json = as_json
+
+    def __eq__(self, other):
+        return isinstance(other, Payload) and (self.value, self.as_json) == (other.value, other.as_json)
+
+    def __hash__(self):
+        return hash((self.value, self.as_json))
+
+    def __str__(self):
+        text = json.dumps(self.value, indent=2) if self.as_json else str(self.value)
+        if LOG_PAYLOADS != "digest":
+            return text
+        data = text.encode("utf-8")
+        return f"<{len(data)} bytes, sha256 {hashlib.sha256(data).hexdigest()[:16]}>"
+
+def payload(value, as_json=False):
+    """Wraps a large value for lazy, size-aware logging; see Payload."""
+    return Payload(value, as_json)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or failing when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Leave msg/args unformatted so the background thread does the formatting
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class RoutingHandler(logging.Handler):
+    """Dispatches records from the shared queue to the file handler of their logger."""
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+
+    def handle(self, record):
+        handler = self.routes.get(record.name)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_router = RoutingHandler()
+_listener = None
+_listener_lock = threading.Lock()
+
+def _start_listener():
+    """Starts the background writer thread once per process."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_queue, _router)
+            _listener.start()
+            atexit.register(_listener.stop)
+
+def init(name, dedup=False):
+    """
+    Initialize a logger with the given name and returns it.
+    Records are handed to a bounded queue and written to logs/<caller>.log by a
+    background thread. With dedup, repeated messages are dropped by an
+    LRU-bounded DuplicateFilter.
+    """
 
     # Transform __main__ to app for the logger name
     logger_name = "app" if name == "__main__" else name
@@ -16,6 +135,9 @@ def init(name):
     # Get the logger with the transformed name
     logger = logging.getLogger(logger_name)
 
+    if dedup and not any(isinstance(f, DuplicateFilter) for f in logger.filters):
+        logger.addFilter(DuplicateFilter())
+
     # Return existing logger if it already has handlers
     if logger.hasHandlers():
         return logger
@@ -38,21 +160,23 @@ def init(name):
         # Construct the full log file path
         log_filename = os.path.join(LOG_FOLDER, f"{current_filename_without_ext}.log")
 
-        # Set up the file handler
+        # Set up the file handler, written from the background thread
         file_handler = logging.FileHandler(log_filename)
         file_handler.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
 
         # Set up the formatter
-        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        formatter = logging.Formatter(LOG_FORMAT)
         file_handler.setFormatter(formatter)
 
-        # Add the handler to the logger
-        logger.addHandler(file_handler)
+        # Route this logger's records through the shared queue
+        _router.routes[logger_name] = file_handler
+        logger.addHandler(DroppingQueueHandler(_queue))
+        _start_listener()
     except Exception as e:
         # If we can't create file handler, just use stream handler
         stream_handler = logging.StreamHandler()
-        stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
         logger.addHandler(stream_handler)
         logger.warning(f"Could not create file handler: {str(e)}")
 
-    return logger
\ No newline at end of file
+    return logger
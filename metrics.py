@@ -0,0 +1,274 @@
+'''
+metrics.py code file.
+'''
+
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logger import init
+
+logger = init(__name__)
+
+# Define constants directly
+METRICS_PREFIX = "vcfgen_"
+METRICS_PORT = os.getenv("METRICS_PORT")  # Serve /metrics on this port when set
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+def label_key(labels):
+    '''
+    Turn keyword labels into a hashable, ordered key.
+    '''
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def escape_label(value):
+    '''
+    Escape a label value for the Prometheus text format.
+    '''
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(key, extra=()):
+    '''
+    Render a label key in Prometheus text format, e.g. {stage="parse"}.
+    '''
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+def format_value(value):
+    '''
+    Render a sample value in Prometheus text format without losing precision:
+    integers exactly, floats with repr (shortest round-tripping form).
+    '''
+    if isinstance(value, int):
+        return str(int(value))
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+class Counter:
+    '''
+    Monotonic counter, one value per label combination.
+    '''
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.exposed_name = f"{name}_total"
+        self.help = help_text
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        '''
+        Yield (sample name, label key, extra labels, value) tuples.
+        '''
+        with self._lock:
+            values = dict(self.values)
+        for key, value in values.items():
+            yield self.exposed_name, key, (), value
+
+    def summary(self):
+        with self._lock:
+            return [(key, {"count": value}) for key, value in self.values.items()]
+
+class Histogram:
+    '''
+    Histogram with cumulative buckets, a sum and a count per label combination.
+    '''
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.exposed_name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = label_key(labels)
+        with self._lock:
+            counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        '''
+        Observe the wall time spent in the block.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+        for key, (counts, total, count) in values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", key, (("le", format_value(bound)),), cumulative
+            yield f"{self.name}_bucket", key, (("le", "+Inf"),), count
+            yield f"{self.name}_sum", key, (), total
+            yield f"{self.name}_count", key, (), count
+
+    def summary(self):
+        with self._lock:
+            return [
+                (key, {"count": count, "sum": total, "avg": total / count if count else 0.0})
+                for key, (_, total, count) in self.values.items()
+            ]
+
+class Registry:
+    '''
+    Process-wide collection of metrics with Prometheus text export.
+    '''
+
+    def __init__(self, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, *args):
+        name = self.prefix + name
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, help_text, *args)
+            return self.metrics[name]
+
+    def counter(self, name, help_text):
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets)
+
+    def export_prometheus(self):
+        '''
+        Render every metric in the Prometheus text exposition format.
+        '''
+        lines = []
+        with self._lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.exposed_name} {metric.help}")
+            lines.append(f"# TYPE {metric.exposed_name} {metric.kind}")
+            for sample, key, extra, value in metric.samples():
+                lines.append(f"{sample}{format_labels(key, extra)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        '''
+        Return one row per metric and label combination, with its count, sum and average.
+        '''
+        rows = []
+        with self._lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            for key, values in metric.summary():
+                row = {
+                    "metric": metric.name[len(self.prefix):],
+                    "labels": ", ".join(f"{name}={value}" for name, value in key),
+                }
+                row.update(values)
+                rows.append(row)
+        return rows
+
+    def reset(self):
+        '''
+        Clear the recorded values, keeping the metric definitions.
+        '''
+        with self._lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            with metric._lock:
+                metric.values.clear()
+
+registry = Registry()
+
+# Metrics shared across modules
+STAGE_SECONDS = registry.histogram("stage_seconds", "Wall time of pipeline stages.")
+MODEL_REQUEST_SECONDS = registry.histogram("model_request_seconds", "Latency of model API calls.")
+MODEL_REQUESTS = registry.counter("model_requests", "Model API calls by outcome and status code.")
+MODEL_PROMPT_BYTES = registry.histogram("model_prompt_bytes", "Size of prompts sent to the model.", BYTES_BUCKETS)
+MODEL_RESPONSE_BYTES = registry.histogram("model_response_bytes", "Size of model responses.", BYTES_BUCKETS)
+MODEL_TOKENS = registry.counter("model_tokens", "Estimated model tokens by prompt protocol and direction.")
+JSON_PARSE_SECONDS = registry.histogram("json_parse_seconds", "Time spent parsing model answers.")
+ROWS_ROUTED = registry.counter("rows_routed", "Prepared rows by the route that resolved them.")
+FALLBACKS = registry.counter("fallbacks", "Times manual cleaning replaced the model result, by reason.")
+FALLBACK_ROWS = registry.counter("fallback_rows", "Rows cleaned manually instead of by the model, by reason.")
+EMAILS = registry.counter("emails", "Outbox emails by outcome.")
+
+def timed_stage(stage):
+    '''
+    Decorator observing a function's wall time in STAGE_SECONDS under the given stage label.
+    '''
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    '''
+    Serves the Prometheus export on /metrics.
+    '''
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.export_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("Metrics request: " + format, *args)
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_http_server(port=None, host="127.0.0.1"):
+    '''
+    Serve /metrics for a local Prometheus scraper from a background thread.
+    Starts at most one server per process (on METRICS_PORT by default) and returns
+    it, or None when no port is configured or the port cannot be bound.
+    '''
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            except OSError as e:
+                logger.warning(f"Could not start metrics server on port {port}: {str(e)}")
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return _server
@@ -3,19 +3,139 @@ model_wrapper.py code file.
 '''
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
-from logger import init
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from logger import init, payload
+from cache import ResponseCache, make_key
+from prompts import prompt_version
+from metrics import MODEL_REQUEST_SECONDS, MODEL_REQUESTS, MODEL_PROMPT_BYTES, MODEL_RESPONSE_BYTES
 
 logger = init(__name__)
 
+# Define constants directly
+DEFAULT_API_URL = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2"
+POOL_SIZE = 8                  # Keep-alive connections kept per host
+MAX_RETRIES = 4                # Retries after the first attempt
+BACKOFF_BASE = 1.0             # Seconds, doubled on every retry
+BACKOFF_MAX = 30.0             # Upper bound for a single backoff or Retry-After wait
+RATE_LIMIT_PER_SECOND = 2.0    # Sustained requests per second
+RATE_LIMIT_BURST = 4           # Requests allowed back to back
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_CONCURRENCY = int(os.getenv('MODEL_MAX_CONCURRENCY', '4'))  # Requests in flight at once
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how fast requests may be started."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available right now."""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+def retry_after_seconds(response):
+    """Returns the wait requested by a Retry-After header in seconds, or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_seconds(attempt: int) -> float:
+    """Returns a full-jitter exponential backoff for the given retry attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def close_response(future):
+    """Closes the response of a finished request nobody is going to read."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
 class ModelWrapper:
-    def __init__(self):
-        self.API_URL = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2"
+    def __init__(self, use_cache=None, api_url=None, hedge_after=None, rate_limit=None):
+        # The endpoint can be pointed at a local stand-in server with HF_API_URL
+        self.API_URL = api_url or os.getenv('HF_API_URL', DEFAULT_API_URL)
         # Get token from environment variable
         self.token = os.getenv('HF_TOKEN')
         self.headers = {"Authorization": f"Bearer {self.token}"}
 
+        # Pooled keep-alive session shared by all threads using this wrapper
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.headers)
+
+        # Client-side rate limit and concurrency budget shared across threads
+        self.rate_limiter = TokenBucket(rate_limit or RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+        self.set_max_concurrency(MAX_CONCURRENCY)
+
+        # Send a second, hedged request when the first is slower than this many seconds
+        if hedge_after is None and os.getenv('HF_HEDGE_AFTER'):
+            hedge_after = float(os.getenv('HF_HEDGE_AFTER'))
+        self.hedge_after = hedge_after
+        self._hedge_executor = ThreadPoolExecutor(max_workers=POOL_SIZE) if hedge_after else None
+
+        # Persistent response cache, disabled with MODEL_CACHE=0
+        if use_cache is None:
+            use_cache = os.getenv('MODEL_CACHE', '1') != '0'
+        self.cache = None
+        if use_cache:
+            try:
+                self.cache = ResponseCache(version=prompt_version())
+                self.cache.invalidate(stale_only=True)
+            except Exception as e:
+                logger.warning(f"Could not open response cache: {str(e)}")
+
+    def set_max_concurrency(self, limit: int):
+        """Sets how many requests may be in flight at once across all threads."""
+        self.max_concurrency = max(1, int(limit))
+        self.concurrency = threading.BoundedSemaphore(self.max_concurrency)
+
+    def cache_stats(self):
+        """Returns the response cache hit/miss counters, or None when caching is off."""
+        return self.cache.stats() if self.cache else None
+
+    def invalidate_cache(self, stale_only=False):
+        """Removes cached responses; all of them unless stale_only is set."""
+        return self.cache.invalidate(stale_only=stale_only) if self.cache else 0
+
     def single_shot_completion(
         self,
         system_prompt: str,
@@ -25,6 +145,14 @@ class ModelWrapper:
         timeout: float = 60.0
     ) -> str:
         """Gets the model response for the given input."""
+        cache_key = make_key(system_prompt, content_prompt, self.API_URL, temperature)
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving model response from cache.")
+                MODEL_REQUESTS.inc(status="cached")
+                return cached
+
         if not self.token:
             logger.error("No Hugging Face token found. Please set HF_TOKEN environment variable.")
             return "{}"
@@ -36,24 +164,30 @@ class ModelWrapper:
 """
         # Log the complete request details
         logger.info("=== API Request Details ===")
-        logger.info(f"System Prompt:\n{system_prompt}")
-        logger.info(f"Content Prompt:\n{content_prompt}")
-        logger.info(f"Full Formatted Prompt:\n{prompt}")
+        logger.info("Prompt sizes: system %d chars, content %d chars", len(system_prompt), len(content_prompt))
+        logger.debug("Full Formatted Prompt:\n%s", payload(prompt))
 
         try:
             # Make request to Hugging Face API
             logger.info("Sending request to Hugging Face API...")
-            response = requests.post(
-                self.API_URL,
-                headers=self.headers,
-                json={"inputs": prompt, "parameters": {"temperature": temperature}},
-                timeout=timeout
-            )
+            MODEL_PROMPT_BYTES.observe(len(prompt.encode("utf-8")))
+            start = time.perf_counter()
+            try:
+                response = self.post_with_retries(
+                    {"inputs": prompt, "parameters": {"temperature": temperature}},
+                    timeout=timeout
+                )
+            except Exception:
+                MODEL_REQUESTS.inc(status="error")
+                raise
+            MODEL_REQUEST_SECONDS.observe(time.perf_counter() - start, mode="single")
+            MODEL_REQUESTS.inc(status=response.status_code)
+            MODEL_RESPONSE_BYTES.observe(len(response.content))
 
             if response.status_code == 200:
                 result = response.json()
                 logger.info("=== API Response ===")
-                logger.info(f"Raw API Response:\n{json.dumps(result, indent=2)}")
+                logger.debug("Raw API Response:\n%s", payload(result, as_json=True))
 
                 # Extract the generated text
                 if isinstance(result, list) and len(result) > 0:
@@ -62,18 +196,190 @@ class ModelWrapper:
                     if '[/INST]' in generated_text:
                         generated_text = generated_text.split('[/INST]')[1].strip()
 
-                    logger.info(f"Processed Response:\n{generated_text}")
+                    logger.info("Processed Response:\n%s", payload(generated_text))
+                    if self.cache and generated_text:
+                        self.cache.put(cache_key, generated_text)
                     return generated_text
 
             elif response.status_code == 429:
-                logger.error("Rate limit exceeded. Please wait before making more requests.")
-                logger.error(f"Response details: {response.text}")
+                logger.error("Rate limit still exceeded after retries. Please wait before making more requests.")
+                logger.error("Response details: %s", payload(response.text))
                 return "{}"
             else:
                 logger.error(f"API Error: {response.status_code}")
-                logger.error(f"Response details: {response.text}")
+                logger.error("Response details: %s", payload(response.text))
                 return "{}"
 
         except Exception as e:
             logger.error(f"Request failed: {str(e)}")
-            return "{}"  # Return empty JSON on error
\ No newline at end of file
+            return "{}"  # Return empty JSON on error
+
+    def stream_completion(
+        self,
+        system_prompt: str,
+        content_prompt: str,
+        model: str = None,  # Not used but kept for compatibility
+        temperature: float = 0.1,
+        timeout: float = 60.0
+    ):
+        """
+        Yields the model response in pieces as the API streams its tokens
+        (server-sent events). A cached response is yielded whole, and a stream
+        that finished is cached like single_shot_completion's responses. On
+        errors "{}" is yielded; a stream cut off midway just ends early.
+        """
+        cache_key = make_key(system_prompt, content_prompt, self.API_URL, temperature)
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving model response from cache.")
+                MODEL_REQUESTS.inc(status="cached")
+                yield cached
+                return
+
+        if not self.token:
+            logger.error("No Hugging Face token found. Please set HF_TOKEN environment variable.")
+            yield "{}"
+            return
+
+        # Format prompt for Mistral
+        prompt = f"""<s>[INST] {system_prompt}
+
+{content_prompt} [/INST]
+"""
+        logger.info("=== API Streaming Request Details ===")
+        logger.info("Prompt sizes: system %d chars, content %d chars", len(system_prompt), len(content_prompt))
+        logger.debug("Full Formatted Prompt:\n%s", payload(prompt))
+
+        MODEL_PROMPT_BYTES.observe(len(prompt.encode("utf-8")))
+        start = time.perf_counter()
+        try:
+            response = self.post_with_retries(
+                {"inputs": prompt, "parameters": {"temperature": temperature}, "stream": True},
+                timeout=timeout,
+                stream=True
+            )
+        except Exception as e:
+            logger.error(f"Request failed: {str(e)}")
+            MODEL_REQUESTS.inc(status="error")
+            yield "{}"
+            return
+        MODEL_REQUESTS.inc(status=response.status_code)
+
+        if response.status_code != 200:
+            logger.error(f"API Error: {response.status_code}")
+            logger.error("Response details: %s", payload(response.text))
+            response.close()
+            yield "{}"
+            return
+
+        pieces = []
+        finished = False
+        try:
+            with response:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        finished = True
+                        break
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        continue
+                    token = event.get("token") or {}
+                    if token.get("text") and not token.get("special"):
+                        pieces.append(token["text"])
+                        yield token["text"]
+                    if event.get("generated_text") is not None:
+                        finished = True
+        except requests.RequestException as e:
+            logger.error(f"Stream interrupted: {str(e)}")
+
+        generated_text = "".join(pieces).strip()
+        MODEL_REQUEST_SECONDS.observe(time.perf_counter() - start, mode="stream")
+        MODEL_RESPONSE_BYTES.observe(len(generated_text.encode("utf-8")))
+        logger.info(f"Streamed {len(pieces)} tokens ({'complete' if finished else 'cut off'})")
+        logger.debug("Streamed Response:\n%s", payload(generated_text))
+        if self.cache and finished and generated_text:
+            self.cache.put(cache_key, generated_text)
+
+    def post_with_retries(self, body: dict, timeout: float = 60.0, stream: bool = False):
+        """
+        Posts the JSON body to the API, retrying timeouts, connection errors and
+        retryable status codes with jittered exponential backoff. A Retry-After
+        header takes precedence over the computed backoff. Every attempt waits
+        for the shared rate limiter and concurrency budget. With stream, the
+        response body is left unread for the caller to iterate. Responses that
+        are retried are closed so their pooled connections are released.
+        Returns the last response, or raises the last error when no attempt got
+        a response.
+        """
+        response = None
+        for attempt in range(MAX_RETRIES + 1):
+            self.rate_limiter.acquire()
+            error = None
+            try:
+                response = self._send(body, timeout, stream)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error = e
+                response = None
+
+            if attempt == MAX_RETRIES:
+                break
+
+            delay = retry_after_seconds(response)
+            delay = min(BACKOFF_MAX, delay) if delay is not None else backoff_seconds(attempt)
+            reason = str(error) if error else f"status {response.status_code}"
+            if response is not None:
+                response.close()
+            logger.warning(f"Request attempt {attempt + 1} failed ({reason}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+        if response is None:
+            raise error
+        return response
+
+    def _send(self, body: dict, timeout: float, stream: bool = False):
+        """
+        Sends one request, hedged with a second one when hedging is enabled.
+        Every request in flight holds a slot of the concurrency budget; the hedge
+        is only sent when a slot and a rate limiter token are free right away.
+        The losing request's response is closed once it arrives.
+        """
+        if not self._hedge_executor:
+            with self.concurrency:
+                return self.session.post(self.API_URL, json=body, timeout=timeout, stream=stream)
+
+        self.concurrency.acquire()
+        primary = self._submit_post(body, timeout, stream)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done or not self.concurrency.acquire(blocking=False):
+            return primary.result()
+        if not self.rate_limiter.try_acquire():
+            self.concurrency.release()
+            return primary.result()
+
+        logger.info(f"No response after {self.hedge_after}s, sending hedged request")
+        hedge = self._submit_post(body, timeout, stream)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.add_done_callback(close_response)
+                    return future.result()
+        # Both requests failed; surface the primary's error
+        return primary.result()
+
+    def _submit_post(self, body: dict, timeout: float, stream: bool):
+        """Posts on the hedge executor; the caller's concurrency slot is released when the request completes."""
+        future = self._hedge_executor.submit(
+            self.session.post, self.API_URL, json=body, timeout=timeout, stream=stream
+        )
+        future.add_done_callback(lambda _: self.concurrency.release())
+        return future
@@ -0,0 +1,327 @@
+'''
+phones.py code file.
+'''
+
+import hashlib
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from rules import HAS_PYARROW, ARROW_STRING, WHITESPACE_CHARS
+
+# Define constants directly
+PHONE_REGIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "phone_regions.json")
+DEFAULT_REGION = os.getenv("PHONE_REGION", "TR")  # Region of numbers dialed without a country code
+
+# Line types reported by PhoneNormalizer.line_type
+MOBILE = "mobile"
+LANDLINE = "landline"
+UNKNOWN = "unknown"    # Valid, but the region's numbering plan does not tell mobiles apart
+INVALID = "invalid"
+
+# Separators removed before matching prefixes
+PHONE_SEPARATORS = re.compile(r'[\s()-]')
+
+# Series-level variants run on Arrow's RE2 engine, so Python's Unicode notions of
+# whitespace and digits are spelled out to keep results identical to the scalar code
+SERIES_STRIP = f'^[{WHITESPACE_CHARS}]+|[{WHITESPACE_CHARS}]+$'
+SERIES_SEPARATORS = f'[{WHITESPACE_CHARS}()-]'
+
+def regions_version(path=PHONE_REGIONS_FILE):
+    '''
+    Returns a short hash of the phone regions table.
+    Changes whenever the table is edited, so results cached against older
+    numbering plans can be told apart.
+    '''
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def as_text(series):
+    '''
+    Convert values to an Arrow-backed string Series the way str() would, missing values included.
+    '''
+    series = pd.Series(series)
+    if series.dtype == ARROW_STRING and not series.hasnans:
+        return series
+    text = series.astype(str)
+    missing = series.isna()
+    if missing.any():
+        text = text.astype(object)
+        text[missing] = series[missing].map(str)
+    return text.astype(ARROW_STRING)
+
+def as_strings(series):
+    '''
+    Convert values to an Arrow-backed string Series, with anything but a string as missing.
+    '''
+    series = pd.Series(series)
+    if series.dtype != ARROW_STRING:
+        # map(type) keeps the str dtype of an empty Series, which cannot be compared to a type
+        is_string = series.map(lambda value: isinstance(value, str), na_action=None).astype(bool)
+        series = series.where(is_string).astype(ARROW_STRING)
+    return series
+
+def clean_phone(phone):
+    '''
+    Strip a raw phone value, a float ".0" suffix and spaces, parentheses and dashes.
+    '''
+    phone = str(phone).strip()
+    if phone.endswith('.0'):
+        phone = phone[:-2]
+    return PHONE_SEPARATORS.sub('', phone)
+
+def clean_phones(series):
+    '''
+    Series-level clean_phone.
+    '''
+    text = as_text(series)
+    text = text.str.replace(SERIES_STRIP, '', regex=True)
+    text = text.str.replace(r'\.0$', '', regex=True)
+    return text.str.replace(SERIES_SEPARATORS, '', regex=True)
+
+def build_trie(prefixes):
+    '''
+    Build a character trie from a dict of prefixes; a node's None key holds the value of the prefix ending there.
+    '''
+    root = {}
+    for prefix, value in prefixes.items():
+        node = root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = value
+    return root
+
+def trie_regex(node):
+    '''
+    Compile a trie into a regex matching its prefixes.
+    Longer prefixes are tried before a prefix ending at the same node, so the
+    first match is the longest, under both Python's re and RE2.
+    '''
+    branches = [re.escape(char) + trie_regex(child) for char, child in sorted(
+        (char, child) for char, child in node.items() if char is not None
+    )]
+    if not branches:
+        return ""
+    if None in node:
+        branches.append("")
+    return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+def digits_regex(lengths, digit):
+    '''
+    Build a regex for a run of digits of one of the given lengths.
+    '''
+    if len(lengths) == lengths[-1] - lengths[0] + 1:
+        return f"{digit}{{{lengths[0]},{lengths[-1]}}}" if len(lengths) > 1 else f"{digit}{{{lengths[0]}}}"
+    return "(?:" + "|".join(f"{digit}{{{length}}}" for length in lengths) + ")"
+
+def valid_regex(regions, digit):
+    '''
+    Build a regex for the normalized numbers of the regions, with the given digit class.
+    '''
+    return r"\+(?:" + "|".join(region.country_code + digits_regex(region.lengths, digit) for region in regions) + ")"
+
+class PhoneRegion:
+    '''
+    Numbering plan of one region, a row of the phone regions table.
+    Numbers are written as +<country_code><national number>, the national number
+    having one of `lengths` digits; mobile numbers start with one of
+    `mobile_prefixes` (none when the plan does not tell them apart). Numbers of
+    trimmed regions keep only their last digits, like the original Turkish rules.
+    '''
+    __slots__ = (
+        "code", "country_code", "international_prefix", "trunk_prefix",
+        "local_prefixes", "lengths", "mobile_prefixes", "trim"
+    )
+
+    def __init__(
+        self, region, country_code, international_prefix, trunk_prefix,
+        local_prefixes, lengths, mobile_prefixes, trim
+    ):
+        self.code = region
+        self.country_code = country_code
+        self.international_prefix = international_prefix
+        self.trunk_prefix = trunk_prefix
+        self.local_prefixes = tuple(local_prefixes)
+        self.lengths = tuple(sorted(lengths))
+        self.mobile_prefixes = tuple(mobile_prefixes)
+        self.trim = trim
+
+    def national(self, digits, international):
+        '''
+        Turn what follows a number's prefix into its national number.
+        Trimmed regions keep the last digits; otherwise a trunk prefix written
+        after the country code, as in +44 (0)20, is dropped.
+        '''
+        if self.trim:
+            return digits[-self.lengths[-1]:]
+        if international and self.trunk_prefix and digits.startswith(self.trunk_prefix) \
+                and len(digits) - len(self.trunk_prefix) in self.lengths:
+            return digits[len(self.trunk_prefix):]
+        return digits
+
+    def nationals(self, digits, international):
+        '''
+        Series-level national, with international a boolean mask.
+        '''
+        if self.trim:
+            return digits.str[-self.lengths[-1]:]
+        if not self.trunk_prefix:
+            return digits
+        size = len(self.trunk_prefix)
+        strip = international & digits.str.startswith(self.trunk_prefix) & (digits.str.len() - size).isin(self.lengths)
+        return digits.where(~strip, digits.str[size:])
+
+class PhoneNormalizer:
+    '''
+    Precompiled phone number normalizer for a default region.
+    All prefixes a number can start with are kept in one trie: "+" and the
+    default region's international prefix before the country code of every
+    region in the table, and the default region's local prefixes. A number is
+    normalized by stripping its longest matching prefix and writing the rest as
+    +<country code><national number> of that prefix's region; numbers without a
+    known prefix belong to the default region. With the "TR" default this is the
+    original Turkish rules for every number that does not dial another country.
+    The Series-level methods handle the default region's numbers with a few
+    vectorized string ops, using the trie compiled to a regex, and only walk the
+    trie per number for the ones dialing another country.
+    '''
+
+    def __init__(self, regions, default_region=DEFAULT_REGION):
+        self.regions = {region.code: region for region in regions}
+        if default_region not in self.regions:
+            raise ValueError(f"Unknown phone region: {default_region}")
+        self.default = self.regions[default_region]
+
+        # Prefix -> (region, whether the prefix includes the country code)
+        self.prefixes = {}
+        for region in regions:
+            self.prefixes["+" + region.country_code] = (region, True)
+            self.prefixes[self.default.international_prefix + region.country_code] = (region, True)
+        for prefix in self.default.local_prefixes:
+            self.prefixes.setdefault(prefix, (self.default, False))
+        self.trie = build_trie(self.prefixes)
+
+        home = {prefix: value for prefix, value in self.prefixes.items() if value[0] is self.default}
+        abroad = {prefix: value for prefix, value in self.prefixes.items() if value[0] is not self.default}
+        self.home_regex = "^" + trie_regex(build_trie(home))
+        self.home_international_regex = trie_regex(build_trie({p: v for p, v in home.items() if v[1]}))
+        self.abroad_regex = trie_regex(build_trie(abroad))
+
+        # Patterns of the normalized numbers, keyed by "+<country code>"
+        self.by_country_code = {"+" + region.country_code: region for region in regions}
+        self.valid_pattern = re.compile(valid_regex(regions, r"\d"))
+        self.valid_regex = valid_regex(regions, r"\p{Nd}")
+        planned = [region for region in regions if region.mobile_prefixes]
+        self.planned_regex = r"\+(?:" + "|".join(region.country_code for region in planned) + ")"
+        self.mobile_regex = r"\+(?:" + "|".join(
+            region.country_code + "(?:" + "|".join(region.mobile_prefixes) + ")" for region in planned
+        ) + ")"
+
+    @classmethod
+    def from_file(cls, path=PHONE_REGIONS_FILE, default_region=DEFAULT_REGION):
+        '''
+        Build a normalizer from the "columns" and "regions" rows of a JSON phone regions table.
+        '''
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        columns = table["columns"]
+        return cls([PhoneRegion(**dict(zip(columns, row))) for row in table["regions"]], default_region)
+
+    def match_prefix(self, text):
+        '''
+        Return (length, (region, international)) of the longest known prefix of the text, or None.
+        '''
+        node = self.trie
+        found = None
+        for length, char in enumerate(text, 1):
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                found = (length, node[None])
+        return found
+
+    def normalize_clean(self, text):
+        '''
+        Normalize a phone number already passed through clean_phone.
+        '''
+        match = self.match_prefix(text)
+        if match is None:
+            region, international, digits = self.default, False, text
+        else:
+            length, (region, international) = match
+            digits = text[length:]
+        return "+" + region.country_code + region.national(digits, international)
+
+    def normalize(self, phone):
+        '''
+        Normalize a raw phone value to +<country code><national number>.
+        '''
+        return self.normalize_clean(clean_phone(phone))
+
+    def normalize_series(self, series):
+        '''
+        Series-level normalize: same rules and results, applied with vectorized string ops.
+        Without pyarrow the scalar method is mapped over the values instead.
+        '''
+        if not HAS_PYARROW:
+            return pd.Series(series).map(self.normalize, na_action=None).astype(object)
+        text = clean_phones(series)
+        abroad = text.str.match(self.abroad_regex).to_numpy(dtype=bool)
+
+        # Numbers of the default region: strip the longest home prefix
+        digits = text.str.replace(self.home_regex, '', regex=True)
+        international = False
+        if not self.default.trim and self.default.trunk_prefix:
+            international = text.str.match(self.home_international_regex)
+        result = "+" + self.default.country_code + self.default.nationals(digits, international)
+
+        if abroad.any():
+            result[abroad] = [self.normalize_clean(number) for number in text[abroad].tolist()]
+        return result
+
+    def is_valid(self, phone):
+        '''
+        Check that a normalized phone number has a valid length for its country code.
+        '''
+        return bool(self.valid_pattern.fullmatch(phone))
+
+    def valid_mask(self, series):
+        '''
+        Series-level is_valid: a boolean mask of the valid normalized phones.
+        '''
+        series = pd.Series(series)
+        if not HAS_PYARROW:
+            return series.astype(object).str.fullmatch(self.valid_pattern, na=False).astype(bool)
+        # is_valid only accepts strings; anything else is invalid
+        mask = as_strings(series).str.fullmatch(self.valid_regex)
+        return mask.fillna(False).astype(bool)
+
+    def line_type(self, phone):
+        '''
+        Classify a normalized phone number as MOBILE, LANDLINE, UNKNOWN or INVALID.
+        '''
+        if not isinstance(phone, str) or not self.is_valid(phone):
+            return INVALID
+        region = next(
+            self.by_country_code[phone[:size]] for size in range(2, 5) if phone[:size] in self.by_country_code
+        )
+        if not region.mobile_prefixes:
+            return UNKNOWN
+        national = phone[len(region.country_code) + 1:]
+        return MOBILE if national.startswith(region.mobile_prefixes) else LANDLINE
+
+    def line_types(self, series):
+        '''
+        Series-level line_type, as a Series of the type labels.
+        '''
+        series = pd.Series(series)
+        if not HAS_PYARROW:
+            return series.map(self.line_type).astype(object)
+        text = as_strings(series)
+        valid = self.valid_mask(text).to_numpy(dtype=bool)
+        planned = text.str.match(self.planned_regex).fillna(False).to_numpy(dtype=bool)
+        mobile = text.str.match(self.mobile_regex).fillna(False).to_numpy(dtype=bool)
+        labels = np.select([~valid, mobile, planned], [INVALID, MOBILE, LANDLINE], UNKNOWN)
+        return pd.Series(labels, index=series.index, dtype=object)
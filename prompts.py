@@ -2,6 +2,8 @@
 prompts.py code file.
 '''
 
+import hashlib
+
 def system_prompt():
     '''
     Returns the system prompt for the data cleaning assistant.
@@ -85,6 +87,7 @@ For VALID contacts, clean as follows:
    - Add '+90' prefix if missing
    - Remove '90', '0', '090', or '0090' prefix
    - Keep existing '+90' prefix
+   - Keep numbers with another country code ('+1', '+44', '0049') unchanged
 
 Examples:
 
@@ -103,4 +106,37 @@ INVALID (Exclude):
 Now, process these contacts:
 {contacts_data}
 """
-    return template.format(contacts_data=contacts_data)
\ No newline at end of file
+    return template.format(contacts_data=contacts_data)
+
+def compact_content_prompt(contacts_data):
+    '''
+    Returns the content prompt of the compact protocol.
+    Rows are sent as numbered "index|name|phone" lines and the model answers with
+    the indices to keep plus only the fields it changed, so output tokens scale
+    with the corrections rather than with the whole input.
+    '''
+    template = """
+Rows are "index|name|phone" lines from a travel spreadsheet.
+Keep only rows of a single traveler with a first and last name. Skip tour leaders and guides, location codes, hotels and venues, cities and addresses, companies, operational notes and rows joining several people with '&' or 'and'.
+For kept rows, remove titles (Mr., Ms., Mrs., Dr.) and extra spaces from the name. Phones are formatted afterwards; only fix a phone if it holds extra text.
+
+Answer with ONLY this JSON object, with no additional text:
+{{"keep": [<indices of kept rows>], "fix": {{"<index>": {{"name": "<cleaned name>", "phone": "<phone>"}}}}}}
+Add a row to "fix" only when its name or phone changes, with only the changed fields.
+
+Rows:
+{contacts_data}
+"""
+    return template.format(contacts_data=contacts_data)
+
+def prompt_version():
+    '''
+    Returns a short hash of the prompt templates.
+    Changes whenever the system, bulk or compact content prompt text is edited, so
+    results cached against an older prompt can be told apart.
+    '''
+    digest = hashlib.sha256()
+    digest.update(system_prompt().encode("utf-8"))
+    digest.update(bulk_content_prompt("").encode("utf-8"))
+    digest.update(compact_content_prompt("").encode("utf-8"))
+    return digest.hexdigest()[:16]
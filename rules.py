@@ -0,0 +1,124 @@
+'''
+rules.py code file.
+'''
+
+import importlib.util
+import json
+import os
+import re
+import sys
+import pandas as pd
+
+# Define constants directly
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "filter_rules.json")
+
+# Rejection reason codes besides the keyword categories of the rules file
+KEEP = ""
+MISSING = "missing"
+DIGITS = "digits"
+SINGLE_WORD = "single_word"
+
+# pyarrow provides the RE2-backed string kernels used for the vectorized checks
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+ARROW_STRING = "string[pyarrow]"
+
+# Python's Unicode character classes spelled out, so patterns behave the same
+# under Python's re and Arrow's RE2 engine (whose \s and \d are ASCII only)
+WHITESPACE_CHARS = "".join(c for c in map(chr, range(0x3001)) if c.isspace())
+DIGIT_CHARS = "".join(c for c in map(chr, range(sys.maxunicode + 1)) if c.isdigit())
+
+class RuleMatcher:
+    '''
+    Precompiled matcher for the metadata keyword rules.
+    All keyword categories from the rules file are compiled into one alternation
+    regex, shared by the row filter used while preprocessing ("row" checks) and
+    the contact name check ("name" checks):
+    - row checks reject missing values, keywords and names containing digits;
+    - name checks reject single-word names and keywords.
+    Rejected rows get the code of the first failing check, kept rows get KEEP.
+    '''
+
+    def __init__(self, keywords):
+        self.categories = list(keywords)
+        escaped = {category: [re.escape(keyword) for keyword in words] for category, words in keywords.items()}
+        # Named groups tell which category matched; the plain alternation is the fast RE2 prefilter
+        self.keyword_pattern = re.compile("|".join(
+            f"(?P<{category}>{'|'.join(words)})" for category, words in escaped.items()
+        ))
+        self.keyword_regex = "|".join(word for words in escaped.values() for word in words)
+        self.digit_regex = f"[{DIGIT_CHARS}]"
+        self.multi_word_regex = f"[^{WHITESPACE_CHARS}][{WHITESPACE_CHARS}]+[^{WHITESPACE_CHARS}]"
+        self.multi_word_pattern = re.compile(self.multi_word_regex)
+
+    @classmethod
+    def from_file(cls, path=RULES_FILE):
+        '''
+        Build a matcher from the keyword categories of a JSON rules file.
+        '''
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["keywords"])
+
+    def keyword_reason(self, name):
+        '''
+        Return the category of the first keyword found in the name, or KEEP.
+        '''
+        match = self.keyword_pattern.search(name.lower())
+        return match.lastgroup if match else KEEP
+
+    def name_reason(self, name):
+        '''
+        Return the rejection code of a contact name, or KEEP for a valid name.
+        '''
+        if not self.multi_word_pattern.search(name):
+            return SINGLE_WORD
+        return self.keyword_reason(name)
+
+    def row_reasons(self, names, phones):
+        '''
+        Return the rejection code of every (name, phone) row as a Series aligned with names.
+        '''
+        names = pd.Series(names)
+        reasons = pd.Series(KEEP, index=names.index, dtype=object)
+        missing = names.isna() | pd.Series(phones, index=names.index).isna()
+        reasons[missing] = MISSING
+
+        text = names[~missing].astype(str).astype(object).str.strip()
+        reasons[text.index] = self._keyword_reasons(text)
+
+        unchecked = text[reasons[text.index] == KEEP]
+        if HAS_PYARROW:
+            has_digits = unchecked.astype(ARROW_STRING).str.contains(self.digit_regex).astype(bool)
+        else:
+            has_digits = unchecked.map(lambda name: any(char.isdigit() for char in name)).astype(bool)
+        reasons[has_digits[has_digits].index] = DIGITS
+        return reasons
+
+    def name_reasons(self, names):
+        '''
+        Vectorized name_reason over a Series of names.
+        '''
+        text = pd.Series(names).astype(object)
+        reasons = self._keyword_reasons(text)
+        if HAS_PYARROW:
+            multi_word = text.astype(ARROW_STRING).str.contains(self.multi_word_regex)
+        else:
+            multi_word = text.str.contains(self.multi_word_pattern, regex=True)
+        reasons[~multi_word.fillna(False).astype(bool).to_numpy()] = SINGLE_WORD
+        return reasons
+
+    def _keyword_reasons(self, text):
+        # Lowercase with Python so Unicode case mapping matches keyword_reason exactly
+        lowered = text.str.lower()
+        reasons = pd.Series(KEEP, index=text.index, dtype=object)
+        # Assign by position so frames concatenated from several files (repeated labels) work too
+        if HAS_PYARROW:
+            hits = lowered.astype(ARROW_STRING).str.contains(self.keyword_regex).fillna(False).astype(bool)
+        else:
+            hits = lowered.notna()
+        hits = hits.to_numpy()
+        candidates = lowered[hits]
+        search = self.keyword_pattern.search
+        reasons[hits] = [
+            match.lastgroup if match else KEEP for match in map(search, candidates)
+        ]
+        return reasons
@@ -0,0 +1,9 @@
+'''
+conftest.py code file.
+'''
+
+import os
+import sys
+
+# Make the flat modules of the repository importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
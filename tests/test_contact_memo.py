@@ -0,0 +1,51 @@
+'''
+test_contact_memo.py code file.
+'''
+
+import json
+import re
+import pandas as pd
+import pytest
+import utils
+from cache import ContactMemo
+
+KNOWN = {"05321112233": "AHMET YILMAZ", "05334445566": "AYSE KAYA"}
+
+@pytest.fixture
+def prompts(tmp_path, monkeypatch):
+    '''
+    Stand-in model answering one contact per distinct known phone in the prompt,
+    the way the model merges identical rows; returns the prompts it received.
+    '''
+    received = []
+
+    def completion(system_prompt, content_prompt, temperature=0.1):
+        received.append(content_prompt)
+        phones = dict.fromkeys(re.findall(r"05\d{9}", content_prompt))
+        return json.dumps([{"name": KNOWN[phone], "phone": "+9" + phone} for phone in phones if phone in KNOWN])
+
+    monkeypatch.setattr(utils, "contact_memo", ContactMemo(path=str(tmp_path / "memo.sqlite"), version="test"))
+    monkeypatch.setattr(utils, "STREAM_RESPONSES", False)
+    monkeypatch.setattr(utils.model_wrapper, "single_shot_completion", completion)
+    return received
+
+def test_memoized_run_matches_full_run_with_duplicate_rows(prompts):
+    df = pd.DataFrame({
+        "Names": ["Dr. AHMET YILMAZ", "Dr. AHMET YILMAZ", "Dr. AYSE KAYA"],
+        "Phone": ["05321112233", "05321112233", "05334445566"],
+    })
+    first = utils.process_contacts_bulk(df, use_memo=True).to_frame()
+    second = utils.process_contacts_bulk(df, use_memo=True).to_frame()
+
+    assert first.values.tolist() == [["AHMET YILMAZ", "+905321112233"], ["AYSE KAYA", "+905334445566"]]
+    assert second.equals(first)
+    # The merged duplicates are asked again; the unambiguous row comes from the memo
+    assert len(prompts) == 2
+    assert "05334445566" not in prompts[1]
+
+def test_put_many_skips_conflicting_verdicts(tmp_path):
+    memo = ContactMemo(path=str(tmp_path / "memo.sqlite"), version="test")
+    same, other = ContactMemo.row_key("A", "1"), ContactMemo.row_key("B", "2")
+    memo.put_many([(same, ("A", "+1")), (same, None), (other, None), (other, None)])
+
+    assert memo.get_many([same, other]) == {other: None}
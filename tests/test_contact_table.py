@@ -0,0 +1,31 @@
+'''
+test_contact_table.py code file.
+'''
+
+import io
+import pandas as pd
+import utils
+from contact_table import ContactTable, STATUS_RULES
+
+def test_extend_with_row_offset():
+    chunk = ContactTable()
+    chunk.append("AHMET YILMAZ", "+905321112233", STATUS_RULES, 0)
+    chunk.append("AYSE KAYA", "+905334445566", STATUS_RULES, 1)
+
+    table = ContactTable().extend(chunk).extend(chunk, row_offset=2)
+
+    assert list(table.rows) == [0, 1, 2, 3]
+    assert list(chunk.rows) == [0, 1]
+
+def test_parse_excel_source_rows_continue_across_chunks(monkeypatch):
+    preprocess = utils.preprocess_excel_chunks
+    monkeypatch.setattr(utils, "preprocess_excel_chunks", lambda file, sheets: preprocess(file, sheets, chunk_rows=2))
+    to_frame = ContactTable.to_frame
+    monkeypatch.setattr(ContactTable, "to_frame", lambda self, include_meta=True: to_frame(self, include_meta))
+    names = ["AHMET YILMAZ", "AYSE KAYA", "MEHMET DEMIR", "FATMA CELIK", "CAN ARSLAN"]
+    rows = "".join(f"{name},053211122{i:02d}\n" for i, name in enumerate(names))
+
+    result = utils.parse_excel(io.BytesIO(("title\n\nNames,Phone\n" + rows).encode("utf-8")))
+
+    assert result["name"].tolist() == names
+    assert result["source_row"].tolist() == [0, 1, 2, 3, 4]
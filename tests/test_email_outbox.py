@@ -0,0 +1,121 @@
+'''
+test_email_outbox.py code file.
+'''
+
+import socketserver
+import threading
+import pytest
+import email_utils
+from email_utils import Outbox, SENT, FAILED, missing_contacts_body, missing_contacts_message
+
+class StandInHandler(socketserver.StreamRequestHandler):
+    '''
+    Local stand-in SMTP server, driven by the server's attributes.
+    Refuses the first `fail_data` messages with a 451 and silently drops the
+    connection after `drop_after` messages.
+    '''
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stand-in")
+        sent = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stand-in")
+            elif command.startswith(("NOOP", "MAIL", "RCPT", "RSET")):
+                self.reply("250 ok")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b".\r\n", b""):
+                        break
+                    data.append(data_line)
+                with server.lock:
+                    refuse = server.fail_data > 0
+                    if refuse:
+                        server.fail_data -= 1
+                    else:
+                        server.messages.append(b"".join(data))
+                if refuse:
+                    self.reply("451 try again later")
+                    continue
+                self.reply("250 queued")
+                sent += 1
+                if sent >= server.drop_after:
+                    return
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+@pytest.fixture
+def server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.messages = []
+    server.fail_data = 1
+    server.drop_after = 3
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(email_utils, "BACKOFF_BASE", 0.01)
+
+def make_config(port):
+    return {
+        "sender": "sender@example.com", "password": None, "recipient": "recipient@example.com",
+        "smtp_server": "127.0.0.1", "smtp_port": port, "starttls": False,
+    }
+
+def test_outbox_retries_and_reconnects(server):
+    config = make_config(server.server_address[1])
+    outbox = Outbox(config)
+    tickets = [
+        outbox.submit(missing_contacts_message([f"Name {i}-{j}" for j in range(3)], config))
+        for i in range(8)
+    ]
+    statuses = [outbox.wait(ticket, 10) for ticket in tickets]
+    outbox.close(5)
+
+    assert [status["state"] for status in statuses] == [SENT] * 8
+    assert statuses[0]["attempts"] == 2
+    assert len(server.messages) == 8
+    # The first refusal and every dropped connection each need a new connection
+    assert server.connections >= 4
+    assert not outbox._worker.is_alive()
+
+def test_outbox_fails_after_retries():
+    config = make_config(1)
+    outbox = Outbox(config, max_retries=2)
+    status = outbox.wait(outbox.submit(missing_contacts_message(["Name"], config)), 10)
+    outbox.close(5)
+
+    assert status["state"] == FAILED
+    assert status["attempts"] == 3
+    assert status["message"].startswith("Failed to send email")
+
+def test_missing_contacts_body():
+    names = [f"Person {i}" for i in range(1000)]
+    expected = (
+        "The following contacts are missing phone numbers:\n\n"
+        + "".join(f"- {name}\n" for name in names)
+        + "\nPlease provide phone numbers for these contacts."
+    )
+    assert missing_contacts_body(names) == expected
@@ -0,0 +1,129 @@
+'''
+test_model_wrapper.py code file.
+'''
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import model_wrapper
+from model_wrapper import ModelWrapper
+
+GENERATED = '[{"name": "AHMET YILMAZ", "phone": "+905321234567"}]'
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''
+    Local stand-in for the inference API, driven by the server's attributes.
+    '''
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            status = server.statuses.pop(0) if server.statuses else 200
+        try:
+            time.sleep(server.delay)
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                pieces = [GENERATED[i:i + 8] for i in range(0, len(GENERATED), 8)]
+                for index, piece in enumerate(pieces):
+                    if server.cut and index == len(pieces) // 2:
+                        return
+                    last = index == len(pieces) - 1
+                    event = {"token": {"text": piece, "special": False}, "generated_text": GENERATED if last else None}
+                    self.wfile.write(f"data:{json.dumps(event)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                return
+            data = json.dumps([{"generated_text": GENERATED}]).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = server.active = server.max_active = 0
+    server.statuses = []
+    server.delay = 0.0
+    server.cut = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setenv("HF_TOKEN", "test")
+    monkeypatch.setattr(model_wrapper, "backoff_seconds", lambda attempt: 0.0)
+
+def make_wrapper(server, **kwargs):
+    return ModelWrapper(use_cache=False, api_url=f"http://127.0.0.1:{server.server_port}", **kwargs)
+
+def wait_idle(wrapper, server):
+    deadline = time.monotonic() + 5
+    while (server.active or wrapper.concurrency._value < wrapper.max_concurrency) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_retries_until_success_and_closes_retried_responses(server):
+    server.statuses = [503, 429]
+    wrapper = make_wrapper(server)
+    responses = []
+    post = wrapper.session.post
+    wrapper.session.post = lambda *args, **kwargs: responses.append(post(*args, **kwargs)) or responses[-1]
+
+    assert wrapper.single_shot_completion("system", "content") == GENERATED
+    assert server.requests == 3
+    assert [response.status_code for response in responses] == [503, 429, 200]
+    assert all(response.raw.closed for response in responses[:2])
+
+def test_hedge_counts_against_concurrency_budget(server):
+    server.delay = 0.3
+    wrapper = make_wrapper(server, hedge_after=0.05)
+    wrapper.set_max_concurrency(1)
+
+    assert wrapper.single_shot_completion("system", "content") == GENERATED
+    wait_idle(wrapper, server)
+    assert server.requests == 1
+    assert server.max_active == 1
+
+def test_hedge_loser_is_closed_and_slots_released(server):
+    server.delay = 0.3
+    wrapper = make_wrapper(server, hedge_after=0.05)
+    wrapper.set_max_concurrency(2)
+    responses = []
+    post = wrapper.session.post
+    wrapper.session.post = lambda *args, **kwargs: responses.append(post(*args, **kwargs)) or responses[-1]
+
+    response = wrapper.post_with_retries({"inputs": "prompt", "stream": False}, stream=True)
+    response.close()
+    wait_idle(wrapper, server)
+    assert server.requests == 2
+    assert server.max_active == 2
+    assert len(responses) == 2
+    assert all(response.raw.closed for response in responses)
+    assert wrapper.concurrency._value == wrapper.max_concurrency
+
+def test_stream_completion(server):
+    wrapper = make_wrapper(server)
+    assert "".join(wrapper.stream_completion("system", "content")) == GENERATED
+
+    server.cut = True
+    pieces = list(wrapper.stream_completion("system", "content"))
+    assert pieces and "".join(pieces) != GENERATED
+    assert GENERATED.startswith("".join(pieces))
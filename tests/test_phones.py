@@ -0,0 +1,24 @@
+'''
+test_phones.py code file.
+'''
+
+import pandas as pd
+from utils import generate_summary, phone_line_types, valid_phone_mask
+
+def test_empty_string_series():
+    empty = pd.Series([], dtype="str")
+
+    assert valid_phone_mask(empty).tolist() == []
+    assert phone_line_types(empty).tolist() == []
+
+def test_mixed_values():
+    phones = pd.Series(["+905321234567", "+902121234567", None, 5, "Missing"], dtype=object)
+
+    assert valid_phone_mask(phones).tolist() == [True, True, False, False, False]
+    assert phone_line_types(phones).tolist() == ["mobile", "landline", "invalid", "invalid", "invalid"]
+
+def test_summary_of_frame_without_phones():
+    summary = generate_summary(pd.DataFrame({"name": ["AHMET YILMAZ", "AYSE KAYA"], "phone": ["Missing", "Missing"]}))
+
+    assert summary["unique_phone_numbers"] == 0
+    assert summary["duplicate_phone_numbers"] == {}
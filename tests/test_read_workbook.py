@@ -0,0 +1,40 @@
+'''
+test_read_workbook.py code file.
+'''
+
+import io
+import re
+import zipfile
+import openpyxl
+from utils import read_workbook_chunks
+
+def workbook_bytes(rows, dimension=None):
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.append(["Contacts"])
+    worksheet.append([])
+    worksheet.append(["Names", "Phone"])
+    for row in rows:
+        worksheet.append(row)
+    data = io.BytesIO()
+    workbook.save(data)
+    if dimension is None:
+        return data.getvalue()
+
+    # Rewrite the sheet's <dimension> tag the way some writers get it wrong
+    source = zipfile.ZipFile(io.BytesIO(data.getvalue()))
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as archive:
+        for name in source.namelist():
+            content = source.read(name)
+            if name.startswith("xl/worksheets/sheet"):
+                content = re.sub(rb'<dimension ref="[^"]*"\s*/>', f'<dimension ref="{dimension}"/>'.encode(), content)
+            archive.writestr(name, content)
+    return output.getvalue()
+
+def test_reads_all_rows_despite_wrong_dimension():
+    rows = [[f"Name {i}", f"0532123456{i}"] for i in range(7)]
+    chunks = list(read_workbook_chunks(io.BytesIO(workbook_bytes(rows, dimension="A1:A1")), chunk_rows=3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert chunks[-1].iloc[0].tolist() == rows[-1]
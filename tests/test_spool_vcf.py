@@ -0,0 +1,35 @@
+'''
+test_spool_vcf.py code file.
+'''
+
+import os
+import zipfile
+import pandas as pd
+from utils import generate_vcf, spool_vcf
+
+def contacts(count):
+    return pd.DataFrame({
+        "name": [f"Ahmet Yilmaz {chr(65 + i % 26)}{chr(65 + i // 26)}" for i in range(count)],
+        "phone": [f"+90532123{i:04d}" for i in range(count)],
+    })
+
+def test_spools_single_file_to_disk():
+    df = contacts(5)
+    path, exported = spool_vcf(df)
+    try:
+        assert exported == 5
+        with open(path, "rb") as f:
+            assert f.read() == generate_vcf(df)
+    finally:
+        os.remove(path)
+
+def test_spools_parts_into_zip():
+    path, exported = spool_vcf(contacts(5), part_size=2)
+    try:
+        assert exported == 5
+        with zipfile.ZipFile(path) as archive:
+            names = archive.namelist()
+            assert names == ["contacts_001.vcf", "contacts_002.vcf", "contacts_003.vcf"]
+            assert [archive.read(name).count(b"BEGIN:VCARD") for name in names] == [2, 2, 1]
+    finally:
+        os.remove(path)
@@ -3,135 +3,379 @@ utils.py code file.
 '''
 
 import pandas as pd
+import csv
+import io
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
 import json
+import multiprocessing
+import os
 import re
-from collections import Counter
-from prompts import system_prompt, bulk_content_prompt
-from logger import init
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from prompts import system_prompt, bulk_content_prompt, compact_content_prompt, prompt_version
+from logger import init, payload
 from model_wrapper import ModelWrapper
+from cache import ContactMemo, make_key
+from contact_table import ContactTable, STATUS_MODEL, STATUS_MEMO, STATUS_MANUAL, STATUS_RULES
+from json_stream import JSONArrayParser, unresolved_rows
+from metrics import (
+    timed_stage,
+    STAGE_SECONDS,
+    JSON_PARSE_SECONDS,
+    ROWS_ROUTED,
+    FALLBACKS,
+    FALLBACK_ROWS,
+    MODEL_TOKENS
+)
+from rules import RuleMatcher, KEEP, HAS_PYARROW
+from phones import PhoneNormalizer, MOBILE, regions_version
 import logging
 
-# Define a duplicate filter to avoid duplicate log messages
-class DuplicateFilter(logging.Filter):
-    def __init__(self):
-        super().__init__()
-        self.logged_messages = set()
-    def filter(self, record):
-        msg = record.getMessage()
-        if msg in self.logged_messages:
-            return False
-        self.logged_messages.add(msg)
-        return True
-
-# Initialize logger and ensure single handler
-# Logger setup
-logger = init(__name__)
-# Remove any existing handlers
-if logger.hasHandlers():
-    logger.handlers.clear()
-
-# Create file handler
-file_handler = logging.FileHandler('utils.log')
-file_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-
-# Add DuplicateFilter to file handler
-duplicate_filter = DuplicateFilter()
-file_handler.addFilter(duplicate_filter)
-
-# Add the file handler to logger
-logger.addHandler(file_handler)
+# Initialize logger, dropping repeated messages
+logger = init(__name__, dedup=True)
 
 model_wrapper = ModelWrapper()
 
+# Metadata keyword rules shared by preprocess_excel and is_valid_name
+rule_matcher = RuleMatcher.from_file()
+
+# Phone numbering plans shared by standardize_phone and is_valid_phone
+phone_normalizer = PhoneNormalizer.from_file()
+
+def open_contact_memo():
+    '''
+    Open the persistent row memo, versioned on the prompt, the model and the phone
+    numbering plans (default region and regions table) that shaped the cleaned rows.
+    Returns None when disabled with CONTACT_MEMO=0 or when it cannot be opened.
+    '''
+    if os.getenv('CONTACT_MEMO', '1') == '0':
+        return None
+    try:
+        version = make_key(
+            prompt_version(), model_wrapper.API_URL, phone_normalizer.default.code, regions_version()
+        )
+        memo = ContactMemo(version=version[:16])
+        memo.invalidate(stale_only=True)
+        return memo
+    except Exception as e:
+        logger.warning(f"Could not open contact memo: {str(e)}")
+        return None
+
+contact_memo = open_contact_memo()
+
+# Estimated token usage and latency of model requests, per prompt protocol
+token_usage = {}
+token_usage_lock = threading.Lock()
+
+# Bulk cleaning configuration
+BULK_CHUNK_TOKEN_BUDGET = 1500  # Approximate tokens of contact lines per request
+BULK_CONCURRENCY = 4            # Maximum concurrent model requests
+CHARS_PER_TOKEN = 4             # Rough characters-per-token ratio for budgeting
+BULK_PROMPT_PROTOCOL = os.getenv("BULK_PROMPT_PROTOCOL", "full")  # "full" JSON echo or "compact" index protocol
+STREAM_RESPONSES = os.getenv("MODEL_STREAM", "0") == "1"          # Parse model responses token by token
+UNRESOLVED_RETRIES = 1          # Times rows skipped by a cut-off or malformed answer are resent
+
+# Workbook ingestion configuration
+EXCEL_HEADER_ROW = 3       # 1-based row holding the column names, after two metadata rows
+INGEST_CHUNK_ROWS = 5000   # Rows read and preprocessed at a time
+SNIFF_BYTES = 64 * 1024    # Leading bytes inspected to detect the input format
+FILE_CONCURRENCY = 4       # Uploaded files cleaned at the same time
+UPLOAD_EXTENSIONS = (".xlsx", ".xls", ".csv", ".tsv", ".parquet")  # Contact files taken from zip uploads
+# Parser processes are started fresh rather than forked: forking the threaded
+# app or CLI could copy locks held by other threads into the children. Fresh
+# processes re-import the entry script, so it must keep its __main__ guard.
+PROCESS_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Magic bytes of the supported binary input formats
+PARQUET_MAGIC = b"PAR1"
+ZIP_MAGIC = b"PK\x03\x04"    # Zip archives, xlsx workbooks included
+XLS_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+# Delta export configuration
+VCARD_PATTERN = re.compile(r"BEGIN:VCARD\r?\n(.*?)END:VCARD", flags=re.DOTALL)
+FINGERPRINT_VERSION = 1
+
+# VCF export configuration
+VCF_CHUNK_SIZE = 5000                     # vCards rendered at a time when streaming
+
+TITLE_PATTERN = re.compile(r"\b(Mr\.|Ms\.|Mrs\.)\s*", flags=re.IGNORECASE)
+
+# Two to four words of letters, optionally joined by an apostrophe or hyphen,
+# separated by single spaces: names the router trusts without asking the model
+PLAIN_NAME = re.compile(r"[^\W\d_]+(?:['’-][^\W\d_]+)*(?: [^\W\d_]+(?:['’-][^\W\d_]+)*){1,3}")
+HAS_DIGIT = re.compile(r"\d")
+
 def standardize_phone(phone):
     '''
-    Standardize a phone number according to Turkish format rules.
+    Standardize a phone number to +<country code><national number>.
     - Remove any spaces, parentheses, or dashes.
-    - If it starts with "0090", "090", "90", or "0", remove that prefix and prepend "+90".
-    - If it already starts with "+90", do nothing.
-    - Finally, take the last 10 digits and return the result in the format: +90XXXXXXXXXX.
-    '''
-    phone = str(phone).strip()
-    if phone.endswith('.0'):
-        phone = phone[:-2]
-    phone = re.sub(r'[\s()-]', '', phone)
-
-    if phone.startswith('+90'):
-        standardized = phone
-    elif phone.startswith('0090'):
-        standardized = '+90' + phone[4:]
-    elif phone.startswith('090'):
-        standardized = '+90' + phone[3:]
-    elif phone.startswith('90'):
-        standardized = '+90' + phone[2:]
-    elif phone.startswith('0'):
-        standardized = '+90' + phone[1:]
+    - Numbers dialing a country of phone_regions.json ("+1...", "0049...") keep it.
+    - Other numbers belong to the default region (PHONE_REGION, "TR" by default),
+      whose prefixes are removed. For Turkey: "+90", "0090", "090", "90" or "0"
+      is removed, the last 10 digits are kept and "+90" is prepended.
+    '''
+    return phone_normalizer.normalize(phone)
+
+def standardize_phones(series):
+    '''
+    Series-level standardize_phone: same rules and results, applied with vectorized string ops.
+    '''
+    return phone_normalizer.normalize_series(series)
+
+def valid_phone_mask(series):
+    '''
+    Series-level is_valid_phone: a boolean mask of the valid standardized phones.
+    '''
+    return phone_normalizer.valid_mask(series)
+
+def phone_line_types(series):
+    '''
+    Classify standardized phones as mobile, landline, unknown (the region's plan
+    does not tell them apart) or invalid.
+    '''
+    return phone_normalizer.line_types(series)
+
+def read_workbook_chunks(file, sheets=None, chunk_rows=INGEST_CHUNK_ROWS):
+    '''
+    Lazily read the Names/Phone columns of a workbook as DataFrame chunks.
+    .xlsx workbooks are streamed with openpyxl in read-only mode: rows are parsed
+    one at a time and only the columns spanning Names and Phone are read. Other
+    formats (.xls) fall back to pandas, still limited to those two columns.
+    Every sheet whose header row (row 3) has both columns is read, or only the
+    given sheet names. Chunk indexes continue across sheets.
+    '''
+    try:
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile):
+        if hasattr(file, "seek"):
+            file.seek(0)
+        frames = pd.read_excel(file, header=EXCEL_HEADER_ROW - 1, sheet_name=sheets, dtype=object)
+        if not isinstance(frames, dict):
+            frames = {sheets: frames}
+        offset = 0
+        for sheet_name, frame in frames.items():
+            if not {"Names", "Phone"} <= set(frame.columns):
+                logger.info(f"Skipping sheet {sheet_name}: no Names/Phone header")
+                continue
+            frame = frame[["Names", "Phone"]]
+            frame.index = pd.RangeIndex(offset, offset + len(frame))
+            offset += len(frame)
+            for start in range(0, len(frame), chunk_rows):
+                yield frame.iloc[start:start + chunk_rows]
+        return
+
+    try:
+        worksheets = workbook.worksheets if sheets is None else [workbook[name] for name in sheets]
+        offset = 0
+        for worksheet in worksheets:
+            # Some writers store a wrong <dimension> (e.g. A1:A1), which would cut the rows short
+            worksheet.reset_dimensions()
+            header = next(worksheet.iter_rows(
+                min_row=EXCEL_HEADER_ROW, max_row=EXCEL_HEADER_ROW, values_only=True
+            ), ())
+            header = list(header)
+            if "Names" not in header or "Phone" not in header:
+                logger.info(f"Skipping sheet {worksheet.title}: no Names/Phone header")
+                continue
+
+            # Only read the column span that holds the two fields we need
+            name_col, phone_col = header.index("Names"), header.index("Phone")
+            first_col = min(name_col, phone_col)
+            name_col, phone_col = name_col - first_col, phone_col - first_col
+            rows = worksheet.iter_rows(
+                min_row=EXCEL_HEADER_ROW + 1,
+                min_col=first_col + 1,
+                max_col=max(name_col, phone_col) + first_col + 1,
+                values_only=True
+            )
+
+            buffer = []
+            for row in rows:
+                buffer.append((row[name_col], row[phone_col]))
+                if len(buffer) == chunk_rows:
+                    yield contact_chunk(buffer, offset)
+                    offset += len(buffer)
+                    buffer = []
+            if buffer:
+                yield contact_chunk(buffer, offset)
+                offset += len(buffer)
+    finally:
+        workbook.close()
+
+def sniff_format(file):
+    '''
+    Detect the format of an input file from its leading bytes.
+    Returns "parquet", "xlsx", "xls", "csv" or "tsv"; text files are told apart by
+    whichever delimiter is more frequent in their first lines.
+    File-like objects are rewound afterwards.
+    '''
+    head = read_head(file)
+    if head.startswith(PARQUET_MAGIC):
+        return "parquet"
+    if head.startswith(ZIP_MAGIC):
+        return "xlsx"
+    if head.startswith(XLS_MAGIC):
+        return "xls"
+    sample = head.decode("utf-8", errors="ignore").splitlines()[:EXCEL_HEADER_ROW + 1]
+    tabs = sum(line.count("\t") for line in sample)
+    commas = sum(line.count(",") for line in sample)
+    return "tsv" if tabs > commas else "csv"
+
+def read_head(file, size=SNIFF_BYTES):
+    '''
+    Return the first bytes of a path or file-like object, rewinding the latter.
+    '''
+    if hasattr(file, "read"):
+        file.seek(0)
+        head = file.read(size)
+        file.seek(0)
+        return head
+    with open(file, "rb") as f:
+        return f.read(size)
+
+def find_text_header(head, delimiter):
+    '''
+    Return the 0-based line of the Names/Phone header in delimited text.
+    The header may sit on the first line or, like in the Excel manifests, after
+    up to two metadata lines.
+    '''
+    lines = head.decode("utf-8-sig", errors="ignore").splitlines()[:EXCEL_HEADER_ROW]
+    for line_no, fields in enumerate(csv.reader(lines, delimiter=delimiter)):
+        if "Names" in fields and "Phone" in fields:
+            return line_no
+    raise ValueError("No Names/Phone header found in the first lines of the file")
+
+def read_text_chunks(file, delimiter, chunk_rows=INGEST_CHUNK_ROWS):
+    '''
+    Read the Names/Phone columns of a CSV/TSV file as DataFrame chunks.
+    Uses pyarrow's multithreaded streaming reader with column projection when
+    available, else pandas. Values are kept as text so leading zeros survive.
+    '''
+    skip_rows = find_text_header(read_head(file), delimiter)
+    offset = 0
+    if HAS_PYARROW:
+        from pyarrow import csv as pa_csv
+        reader = pa_csv.open_csv(
+            file,
+            read_options=pa_csv.ReadOptions(skip_rows=skip_rows, block_size=1 << 20, encoding="utf-8"),
+            parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=["Names", "Phone"],
+                column_types={"Names": "string", "Phone": "string"},
+                strings_can_be_null=True
+            )
+        )
+        batches = (batch.to_pandas() for batch in reader)
     else:
-        standardized = '+90' + phone
+        batches = pd.read_csv(
+            file, sep=delimiter, skiprows=skip_rows, usecols=["Names", "Phone"],
+            dtype=str, chunksize=chunk_rows, encoding="utf-8-sig"
+        )
+    for batch in batches:
+        for start in range(0, len(batch), chunk_rows):
+            chunk = batch.iloc[start:start + chunk_rows]
+            yield contact_frame(chunk, offset)
+            offset += len(chunk)
 
-    if standardized.startswith('+90'):
-        digits = standardized[3:]
-        digits = digits[-10:]
-        standardized = '+90' + digits
-    return standardized
+def read_parquet_chunks(file, chunk_rows=INGEST_CHUNK_ROWS):
+    '''
+    Read the Names/Phone columns of a Parquet file as DataFrame chunks,
+    decoding only those two columns, one batch at a time.
+    '''
+    from pyarrow import parquet as pq
+    offset = 0
+    parquet_file = pq.ParquetFile(file)
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=["Names", "Phone"]):
+        chunk = batch.to_pandas()
+        yield contact_frame(chunk, offset)
+        offset += len(chunk)
+
+def read_contact_chunks(file, sheets=None, chunk_rows=INGEST_CHUNK_ROWS):
+    '''
+    Read the Names/Phone columns of any supported input as DataFrame chunks.
+    The format is detected from the file contents, so misnamed uploads still
+    work. Sheets only apply to Excel workbooks.
+    '''
+    file_format = sniff_format(file)
+    logger.info(f"Detected {file_format} input")
+    if file_format == "parquet":
+        return read_parquet_chunks(file, chunk_rows)
+    if file_format in ("csv", "tsv"):
+        return read_text_chunks(file, "\t" if file_format == "tsv" else ",", chunk_rows)
+    return read_workbook_chunks(file, sheets, chunk_rows)
+
+def contact_frame(frame, offset):
+    '''
+    Give a Names/Phone chunk object columns and a running index, like workbook chunks.
+    '''
+    frame = frame[["Names", "Phone"]].astype(object)
+    frame = frame.where(frame.notna(), None)
+    frame.index = pd.RangeIndex(offset, offset + len(frame))
+    return frame
 
-def is_turkish_mobile(phone):
+def contact_chunk(rows, offset):
     '''
-    Check if a standardized phone number is a Turkish mobile number.
-    Turkish mobile numbers must be in the format +90XXXXXXXXXX where the first digit of the local part is 5.
+    Build a Names/Phone DataFrame chunk from raw (name, phone) tuples.
     '''
-    return phone.startswith('+90') and len(phone) == 13 and phone[3] == '5'
+    return pd.DataFrame(
+        rows,
+        columns=["Names", "Phone"],
+        index=pd.RangeIndex(offset, offset + len(rows)),
+        dtype=object
+    )
 
-def preprocess_excel(file):
+def filter_contact_rows(df):
+    '''
+    Drop rows that look like metadata and clean the remaining Names/Phone values.
+    '''
+    # Filter rows that look like metadata, keeping the rejection reason per row
+    reasons = rule_matcher.row_reasons(df['Names'], df['Phone'])
+    rejected = reasons[reasons != KEEP]
+    for reason, count in rejected.value_counts().items():
+        logger.info(f"Filtered out {count} rows: {reason}")
+    if logger.isEnabledFor(logging.DEBUG):
+        for idx, reason in rejected.items():
+            logger.debug("Filtered out row %s (%s): %s", idx, reason, df.at[idx, 'Names'])
+
+    df_filtered = df[reasons == KEEP].copy()
+    logger.info(f"Filtered from {len(df)} to {len(df_filtered)} rows")
+
+    # Clean contact data
+    df_filtered['Names'] = df_filtered['Names'].astype(str).str.strip()
+    df_filtered['Phone'] = df_filtered['Phone'].astype(str).str.strip()
+    return df_filtered
+
+def preprocess_excel_chunks(file, sheets=None, chunk_rows=INGEST_CHUNK_ROWS):
     '''
-    Preprocess the Excel file with strict contact validation.
+    Stream the input file and yield preprocessed Names/Phone chunks as they are read.
+    The time spent reading and filtering, without the consumer's time between
+    chunks, is recorded as the preprocess_excel stage.
+    '''
+    elapsed = 0.0
+    start = time.perf_counter()
+    for chunk in read_contact_chunks(file, sheets, chunk_rows):
+        filtered = filter_contact_rows(chunk)
+        elapsed += time.perf_counter() - start
+        yield filtered
+        start = time.perf_counter()
+    elapsed += time.perf_counter() - start
+    STAGE_SECONDS.observe(elapsed, stage="preprocess_excel")
+
+def preprocess_excel(file, sheets=None):
+    '''
+    Preprocess an Excel, CSV, TSV or Parquet file with strict contact validation.
     '''
     logger.info("=== Starting Excel Preprocessing ===")
     try:
-        # Read raw Excel data
-        df = pd.read_excel(file, header=2)
-        logger.info(f"Raw Excel data loaded: {len(df)} rows")
-
-        # Filter rows that look like metadata
-        def is_valid_row(row):
-            if pd.isna(row['Names']) or pd.isna(row['Phone']):
-                return False
-
-            name = str(row['Names']).strip()
-
-            # Reject if row contains obvious metadata indicators
-            invalid_patterns = [
-                '(', ')', '&',                     # Parentheses and multiple people
-                'hotel', 'tour', 'guide',          # Travel terms
-                'meeting', 'storage', 'space',     # Facility terms
-                'street', 'ave', 'st,', 'blvd',    # Address terms
-                'san francisco', 'las vegas',      # City names
-                'los angeles', 'miami', 'new york',
-                'sfo', 'nyc', 'lax', 'las', 'mia',  # City codes
-                'busa', 'sll', 'kantara'           # Company names
-            ]
-
-            name_lower = name.lower()
-            if any(pattern in name_lower for pattern in invalid_patterns):
-                logger.info(f"Filtered out metadata row: {name}")
-                return False
-
-            # Check for numeric patterns (likely addresses)
-            if any(char.isdigit() for char in name):
-                logger.info(f"Filtered out row with numbers: {name}")
-                return False
-
-            return True
-
-        # Apply filtering
-        df_filtered = df[df.apply(is_valid_row, axis=1)].copy()
-        logger.info(f"Filtered from {len(df)} to {len(df_filtered)} rows")
-
-        # Clean contact data
-        df_filtered['Names'] = df_filtered['Names'].str.strip()
-        df_filtered['Phone'] = df_filtered['Phone'].astype(str).str.strip()
+        chunks = list(preprocess_excel_chunks(file, sheets))
+        if chunks:
+            df_filtered = pd.concat(chunks)
+        else:
+            df_filtered = pd.DataFrame(columns=["Names", "Phone"], dtype=object)
 
         logger.info("Successfully preprocessed Excel data")
         return df_filtered
@@ -140,163 +384,503 @@ def preprocess_excel(file):
         logger.error(f"Error in preprocessing Excel: {str(e)}")
         raise
 
-def clean_json_response(response: str) -> str:
+def estimate_tokens(text):
     '''
-    Clean the JSON response from the LLM by extracting only the JSON array part.
-    Handles responses that might include explanatory text before or after the JSON.
+    Roughly estimate the number of model tokens in a piece of text.
     '''
-    # Find the JSON array portion between brackets
-    try:
-        # Find the start and end of the JSON array
-        start_idx = response.find('[')
-        end_idx = response.rfind(']') + 1
+    return len(text) // CHARS_PER_TOKEN + 1
 
-        if start_idx == -1 or end_idx == 0:
-            raise ValueError("No JSON array found in response")
+def format_contact_line(row):
+    '''
+    Format a prepared (index, name, phone) row as a line of the bulk prompt.
+    '''
+    _, name, phone = row
+    return f"Name: {name}, Phone: {phone}"
 
-        # Extract just the JSON array part
-        json_str = response[start_idx:end_idx]
+def format_compact_line(index, row):
+    '''
+    Format a prepared row as an "index|name|phone" line of the compact prompt.
+    '''
+    _, name, phone = row
+    return "|".join([str(index), " ".join(name.replace("|", "/").split()), " ".join(phone.replace("|", "/").split())])
 
-        # Clean up any remaining markdown markers
-        json_str = re.sub(r'```json|```', '', json_str)
+def chunk_contacts(rows, token_budget=BULK_CHUNK_TOKEN_BUDGET, protocol="full"):
+    '''
+    Split prepared contact rows into chunks whose contact lines fit in the token budget.
+    Each row is an (index, name, phone) tuple; row order is preserved across chunks.
+    Lines are measured in the format of the given prompt protocol.
+    A single row larger than the budget still gets a chunk of its own.
+    '''
+    chunks = []
+    current = []
+    current_tokens = 0
+    for row in rows:
+        if protocol == "compact":
+            line = format_compact_line(len(current), row)
+        else:
+            line = format_contact_line(row)
+        row_tokens = estimate_tokens(line)
+        if current and current_tokens + row_tokens > token_budget:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(row)
+        current_tokens += row_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def route_rows(rows):
+    '''
+    Split prepared (position, name, phone) rows by how confidently the local rules decide them.
+    A row is accepted locally when, after manual cleaning, its name is a plain
+    valid name and its phone a valid number for its country code (is_valid_phone);
+    it is rejected locally when its name fails is_valid_name or its phone has no
+    digit at all. Everything in between is left for the model.
+    Returns the accepted contacts as a ContactTable, the number of rejected rows
+    and the uncertain rows.
+    '''
+    accepted = ContactTable()
+    if not rows:
+        return accepted, 0, []
+
+    positions, names, phones = zip(*rows)
+    cleaned_names = pd.Series(names, dtype=object).str.replace(TITLE_PATTERN, "", regex=True).str.strip()
+    cleaned_phones = standardize_phones(pd.Series(phones, dtype=object))
+    valid_name = (rule_matcher.name_reasons(cleaned_names) == KEEP).to_numpy(dtype=bool)
+    plain_name = [bool(PLAIN_NAME.fullmatch(name)) for name in cleaned_names]
+    valid_phone = valid_phone_mask(cleaned_phones).to_numpy(dtype=bool)
+
+    uncertain = []
+    rejected = 0
+    for row, name, phone, name_ok, plain, phone_ok in zip(
+        rows, cleaned_names, cleaned_phones, valid_name, plain_name, valid_phone
+    ):
+        if name_ok and plain and phone_ok:
+            accepted.append(name, phone, STATUS_RULES, row[0])
+        elif not name_ok or not HAS_DIGIT.search(row[2]):
+            rejected += 1
+            logger.debug("Rejected row %s locally - Name: %s, Phone: %s", row[0], row[1], row[2])
+        else:
+            uncertain.append(row)
+    return accepted, rejected, uncertain
+
+@timed_stage("clean_contacts")
+def process_contacts_bulk(
+    df,
+    batched=True,
+    token_budget=BULK_CHUNK_TOKEN_BUDGET,
+    concurrency=BULK_CONCURRENCY,
+    use_memo=True,
+    route=True,
+    protocol=None
+):
+    '''
+    Process all contacts in bulk.
+    With route, rows the local rules decide confidently are resolved without the
+    model, see route_rows. Rows already in the persistent row memo are resolved
+    from it; only the remaining rows are sent to the model, using the "full" or
+    "compact" prompt protocol (BULK_PROMPT_PROTOCOL by default). In batched mode those rows are split
+    into token-budgeted chunks that are cleaned concurrently (at most
+    `concurrency` requests in flight), otherwise they go out in a single API call.
+    A chunk whose LLM result cannot be used falls back to manual cleaning on its own.
+    Returns a ContactTable of the cleaned contacts in row order, with the
+    position of the raw row each one came from.
+    '''
+    logger.info("=== Starting Bulk Contact Processing ===")
 
-        return json_str.strip()
-    except Exception as e:
-        logger.error(f"Error cleaning JSON response: {str(e)}")
-        logger.error(f"Original response: {response}")
-        raise
+    # Create contacts list from all rows, keyed by position
+    rows = [
+        (pos, str(name).strip(), str(phone).strip())
+        for pos, (name, phone) in enumerate(zip(df["Names"].tolist(), df["Phone"].tolist()))
+    ]
+    if logger.isEnabledFor(logging.DEBUG):
+        for (pos, name, phone), idx in zip(rows, df.index):
+            logger.debug("Raw contact %s: Name: %s, Phone: %s", idx, name, phone)
+
+    logger.info(f"Prepared {len(rows)} contacts for processing")
+    if not rows:
+        return ContactTable()
+
+    tables = []
+    pending = rows
+    if route:
+        accepted, rejected, pending = route_rows(rows)
+        tables.append(accepted)
+        ROWS_ROUTED.inc(len(accepted), route="local_accept")
+        ROWS_ROUTED.inc(rejected, route="local_reject")
+        logger.info(
+            f"Routing: {len(accepted)} rows accepted locally, {rejected} rejected locally, "
+            f"{len(pending)} sent on to the model"
+        )
 
-def process_contacts_bulk(df):
+    memo = contact_memo if use_memo else None
+    if memo and pending:
+        keys = [ContactMemo.row_key(name, phone) for _, name, phone in pending]
+        found = memo.get_many(keys)
+        memoized = ContactTable()
+        uncached = []
+        for row, key in zip(pending, keys):
+            if key not in found:
+                uncached.append(row)
+            elif found[key]:
+                memoized.append(*found[key], STATUS_MEMO, row[0])
+        tables.append(memoized)
+        ROWS_ROUTED.inc(len(pending) - len(uncached), route="memo")
+        logger.info(f"Row memo resolved {len(pending) - len(uncached)} rows, {len(uncached)} left to clean")
+        pending = uncached
+
+    if pending:
+        protocol = protocol or BULK_PROMPT_PROTOCOL
+        ROWS_ROUTED.inc(len(pending), route="model")
+        chunks = chunk_contacts(pending, token_budget, protocol) if batched else [pending]
+        workers = max(1, min(concurrency, len(chunks)))
+        logger.info(f"Processing {len(pending)} contacts in {len(chunks)} chunk(s) with {workers} worker(s)")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                process_contact_chunk, range(len(chunks)), chunks, [protocol] * len(chunks)
+            ))
+
+        for chunk_table, memo_entries in results:
+            tables.append(chunk_table)
+            if memo:
+                memo.put_many(memo_entries)
+
+    contacts = ContactTable.concat(tables).sorted_by_row()
+    logger.info(f"=== Bulk Processing Complete: {len(contacts)} contacts from {len(rows)} rows ===")
+    return contacts
+
+def process_contact_chunk(chunk_idx, rows, protocol="full", retries=UNRESOLVED_RETRIES):
     '''
-    Process all contacts in bulk with a single API call.
+    Clean one chunk of prepared rows with a single API call.
+    Returns a ContactTable of the cleaned contacts, tagged with their source row
+    positions, and the (memo key, contact) entries to memoize. Rows a cut-off or
+    malformed answer left unresolved are resent on their own, up to `retries`
+    times, then cleaned manually. Falls back to manual cleaning of just this
+    chunk, without memoizing it, if the call or its parsing fails.
     '''
-    logger.info("=== Starting Bulk Contact Processing ===")
     try:
-        # Create contacts list from all rows
-        contacts_list = []
-        for idx, row in df.iterrows():
-            try:
-                name = str(row["Names"]).strip()
-                phone = str(row["Phone"]).strip()
-                contacts_list.append(f"Name: {name}, Phone: {phone}")
-                logger.info(f"Raw contact {idx}: Name: {name}, Phone: {phone}")
-            except Exception as e:
-                logger.warning(f"Could not process row {idx}: {str(e)}")
-
-        logger.info(f"Prepared {len(contacts_list)} contacts for processing")
+        contacts, memo_entries, unresolved = clean_chunk_with_llm(chunk_idx, rows, protocol)
+    except Exception as e:
+        logger.error(f"Error in bulk processing of chunk {chunk_idx}: {str(e)}")
+        logger.info(f"Falling back to manual cleaning for chunk {chunk_idx}")
+        FALLBACKS.inc(reason="chunk_error")
+        FALLBACK_ROWS.inc(len(rows), reason="chunk_error")
+        return manual_clean_rows(rows), []
+
+    if unresolved:
+        if retries:
+            logger.info(f"Resending {len(unresolved)} unresolved rows of chunk {chunk_idx}")
+            retried, retried_entries = process_contact_chunk(chunk_idx, unresolved, protocol, retries - 1)
+        else:
+            logger.info(f"Manually cleaning {len(unresolved)} unresolved rows of chunk {chunk_idx}")
+            FALLBACKS.inc(reason="unresolved")
+            FALLBACK_ROWS.inc(len(unresolved), reason="unresolved")
+            retried, retried_entries = manual_clean_rows(unresolved), []
+        contacts.extend(retried)
+        memo_entries = memo_entries + retried_entries
+    return contacts, memo_entries
+
+def assign_contacts_to_rows(rows, contacts):
+    '''
+    Attribute cleaned contacts back to the raw rows they came from.
+    A contact is matched to an unclaimed row with the same standardized phone,
+    preferring one whose raw name contains the cleaned name; rows left without a
+    contact were rejected by the model. A contact whose phone matches no row
+    stays next to the previously matched one.
+    Sets the source rows of the contacts table in place and returns, per
+    contact, whether it matched a row.
+    '''
+    rows_by_phone = {}
+    standardized = standardize_phones([phone for _, _, phone in rows])
+    for (pos, name, _), phone in zip(rows, standardized):
+        rows_by_phone.setdefault(phone, []).append((pos, " ".join(name.split()).casefold()))
+
+    anchor = rows[0][0]
+    matched = []
+    for i, (name, phone) in enumerate(contacts):
+        candidates = rows_by_phone.get(phone)
+        matched.append(bool(candidates))
+        if candidates:
+            wanted = " ".join(name.split()).casefold()
+            choice = next((j for j, (_, raw) in enumerate(candidates) if wanted in raw), 0)
+            anchor = candidates.pop(choice)[0]
+        contacts.rows[i] = anchor
+    return matched
+
+def record_token_usage(protocol, input_tokens, output_tokens, latency):
+    '''
+    Add one model request to the running token accounting of its prompt protocol.
+    '''
+    with token_usage_lock:
+        usage = token_usage.setdefault(
+            protocol, {"requests": 0, "input_tokens": 0, "output_tokens": 0, "latency_s": 0.0}
+        )
+        usage["requests"] += 1
+        usage["input_tokens"] += input_tokens
+        usage["output_tokens"] += output_tokens
+        usage["latency_s"] += latency
+    MODEL_TOKENS.inc(input_tokens, protocol=protocol, direction="input")
+    MODEL_TOKENS.inc(output_tokens, protocol=protocol, direction="output")
+
+def token_usage_report():
+    '''
+    Return the estimated token usage and latency per prompt protocol, with per-request averages.
+    '''
+    with token_usage_lock:
+        report = {protocol: dict(usage) for protocol, usage in token_usage.items()}
+    for usage in report.values():
+        for key in ("input_tokens", "output_tokens", "latency_s"):
+            usage[f"avg_{key}"] = round(usage[key] / usage["requests"], 3)
+    return report
+
+def reset_token_usage():
+    '''
+    Clear the token accounting.
+    '''
+    with token_usage_lock:
+        token_usage.clear()
 
-        # Create batch data string
-        batch_data = "\n".join(contacts_list)
+def read_response(pieces, parsers):
+    '''
+    Feed a model response, whole or streamed in pieces, through incremental parsers.
+    Returns the full response text and the items each parser decoded.
+    '''
+    parts = []
+    items = [[] for _ in parsers]
+    parse_time = 0.0
+    for piece in pieces:
+        parts.append(piece)
+        start = time.perf_counter()
+        for parser, found in zip(parsers, items):
+            found.extend(parser.feed(piece))
+        parse_time += time.perf_counter() - start
+    JSON_PARSE_SECONDS.observe(parse_time)
+    return "".join(parts), items
+
+def full_candidates(elements):
+    '''
+    Collect the (index, name, phone) candidates of a full-protocol answer's contacts,
+    index being the contact's position among the well-formed ones.
+    Returns the candidates and the number of empty or malformed contacts.
+    '''
+    candidates = []
+    invalid_count = 0
+    for idx, contact in enumerate(elements):
+        try:
+            name = contact.get("name", "").strip()
+            phone = contact.get("phone", "").strip()
 
-        # Get prompts
+            if name and phone:
+                candidates.append((idx, name, phone))
+            else:
+                logger.warning(f"Skipped empty contact {idx}")
+                invalid_count += 1
+        except Exception as e:
+            logger.warning(f"Error processing contact {idx}: {str(e)}")
+            invalid_count += 1
+    return candidates, invalid_count
+
+def compact_candidates(keep, fixes, rows):
+    '''
+    Collect the (row, name, phone) candidates of a compact-protocol answer,
+    {"keep": [indices], "fix": {index: changed fields}}, row indexing into rows.
+    Kept rows take their raw name and phone unless the model changed them.
+    Returns the candidates, the row index of every kept item (None when unknown)
+    and the number of unknown indices.
+    '''
+    fixes = {key: value for key, value in fixes if isinstance(value, dict)}
+    candidates = []
+    anchors = []
+    seen = set()
+    invalid_count = 0
+    for idx in keep:
+        idx = str(idx)
+        if not idx.isdigit() or int(idx) >= len(rows):
+            logger.warning(f"Skipped unknown row index {idx}")
+            anchors.append(None)
+            invalid_count += 1
+            continue
+        anchors.append(int(idx))
+        if idx in seen:
+            continue
+        seen.add(idx)
+        _, name, phone = rows[int(idx)]
+        changes = fixes.get(idx, {})
+        name = str(changes.get("name") or name).strip()
+        phone = str(changes.get("phone") or phone).strip()
+        candidates.append((int(idx), name, phone))
+    return candidates, anchors, invalid_count
+
+def clean_chunk_with_llm(chunk_idx, rows, protocol="full"):
+    '''
+    Send one chunk of rows to the model.
+    With the "full" protocol the model echoes the cleaned contacts as JSON, which
+    are attributed back to their rows by phone; with "compact" it answers with row
+    indices and changed fields only, and phones are standardized locally.
+    The answer is parsed incrementally, token by token with MODEL_STREAM=1, so a
+    cut-off or partly malformed answer keeps every well-formed contact; the rows
+    it may have skipped are reported as unresolved.
+    Returns the cleaned contacts, the memo entries (see process_contact_chunk)
+    and the unresolved rows.
+    Raises if the response holds no JSON at all or, when complete, no valid contact.
+    '''
+    # Create batch data string and get prompts
+    if protocol == "compact":
+        batch_data = "\n".join(format_compact_line(i, row) for i, row in enumerate(rows))
+        cnt_prompt = compact_content_prompt(batch_data)
+        parsers = [JSONArrayParser('"keep"'), JSONArrayParser('"fix"', members=True)]
+    else:
+        batch_data = "\n".join(format_contact_line(row) for row in rows)
         cnt_prompt = bulk_content_prompt(batch_data)
-        sys_prompt = system_prompt()
-
-        # Log complete LLM input
-        logger.info("=== LLM Request Details ===")
-        logger.info(f"System Prompt:\n{sys_prompt}")
-        logger.info(f"Content Prompt:\n{cnt_prompt}")
-
-        # Make API call
-        logger.info(f"Sending batch prompt to OpenAI API with {len(contacts_list)} contacts")
-        response = model_wrapper.single_shot_completion(
+        parsers = [JSONArrayParser()]
+    sys_prompt = system_prompt()
+
+    # Log complete LLM input
+    logger.info(f"=== LLM Request Details (chunk {chunk_idx}) ===")
+    logger.info("System Prompt:\n%s", payload(sys_prompt))
+    logger.info("Content Prompt:\n%s", payload(cnt_prompt))
+
+    # Make API call, parsing the answer as it arrives
+    logger.info(f"Sending chunk {chunk_idx} prompt to the model API with {len(rows)} contacts")
+    start = time.perf_counter()
+    if STREAM_RESPONSES:
+        pieces = model_wrapper.stream_completion(
             system_prompt=sys_prompt,
             content_prompt=cnt_prompt,
             temperature=0.1
         )
+    else:
+        pieces = [model_wrapper.single_shot_completion(
+            system_prompt=sys_prompt,
+            content_prompt=cnt_prompt,
+            temperature=0.1
+        )]
+    response, items = read_response(pieces, parsers)
+    latency = time.perf_counter() - start
+
+    # Account for the request's tokens
+    input_tokens = estimate_tokens(sys_prompt) + estimate_tokens(cnt_prompt)
+    output_tokens = estimate_tokens(response)
+    record_token_usage(protocol, input_tokens, output_tokens, latency)
+    logger.info(
+        f"Chunk {chunk_idx} ({protocol} protocol): ~{input_tokens} input tokens, "
+        f"~{output_tokens} output tokens, {latency:.2f}s"
+    )
 
-        # Log complete response
-        logger.info("=== LLM Response ===")
-        logger.info(f"Raw LLM Response:\n{response}")
-
-        try:
-            # Clean the response before parsing
-            cleaned_response = clean_json_response(response)
-            logger.info(f"Cleaned Response for parsing:\n{cleaned_response}")
-
-            cleaned_contacts = json.loads(cleaned_response)
-            if not isinstance(cleaned_contacts, list):
-                raise ValueError("LLM response is not a list of contacts")
-
-            logger.info(f"Successfully parsed {len(cleaned_contacts)} contacts from LLM response")
-
-            # Process valid contacts
-            valid_contacts = []
-            invalid_count = 0
-
-            for idx, contact in enumerate(cleaned_contacts):
-                try:
-                    name = contact.get("name", "").strip()
-                    phone = contact.get("phone", "").strip()
-
-                    if name and phone:
-                        phone = standardize_phone(phone)
-                        if is_valid_phone(phone):
-                            valid_contacts.append({"name": name, "phone": phone})
-                            logger.info(f"Valid contact {idx} - Name: {name}, Phone: {phone}")
-                        else:
-                            logger.warning(f"Invalid contact {idx} - Name: {name}, Phone: {phone}")
-                            invalid_count += 1
-                    else:
-                        logger.warning(f"Skipped empty contact {idx}")
-                        invalid_count += 1
-                except Exception as e:
-                    logger.warning(f"Error processing contact {idx}: {str(e)}")
-                    invalid_count += 1
-
-            if not valid_contacts:
-                logger.warning("No valid contacts found in LLM response")
-                raise ValueError("No valid contacts found in LLM response")
-
-            logger.info(f"=== Bulk Processing Complete ===")
-            logger.info(f"- Total contacts processed: {len(cleaned_contacts)}")
-            logger.info(f"- Valid contacts: {len(valid_contacts)}")
-            logger.info(f"- Invalid contacts: {invalid_count}")
-
-            return valid_contacts
-
-        except json.JSONDecodeError as je:
-            logger.error("Failed to parse LLM response as JSON:")
-            logger.error(f"Error: {str(je)}")
-            logger.error(f"Full response: {response}")
-            raise
-
-    except Exception as e:
-        logger.error(f"Error in bulk processing: {str(e)}")
-        logger.info("Falling back to manual cleaning")
+    # Log complete response
+    logger.info(f"=== LLM Response (chunk {chunk_idx}) ===")
+    logger.info("Raw LLM Response:\n%s", payload(response))
+
+    if not parsers[0].started:
+        logger.error("No JSON array found in LLM response: %s", payload(response))
+        raise ValueError("No JSON array found in response")
+    for parser in parsers:
+        if parser.gaps or (parser.started and not parser.complete):
+            logger.warning(
+                f"Chunk {chunk_idx} answer is {'complete' if parser.complete else 'cut off'} "
+                f"with {len(parser.gaps)} malformed item(s)"
+            )
+
+    if protocol == "compact":
+        keep_parser, fix_parser = parsers
+        candidates, anchors, invalid_count = compact_candidates(items[0], items[1], rows)
+        kept = {idx for idx in anchors if idx is not None}
+        unresolved = unresolved_rows(anchors, keep_parser, len(rows)) - kept
+        # Kept rows whose fixes may be missing are unresolved too
+        if fix_parser.gaps or (not fix_parser.complete and (fix_parser.started or not keep_parser.complete)):
+            fix_anchors = [int(key) if key.isdigit() else None for key, _ in items[1]]
+            unresolved |= unresolved_rows(fix_anchors, fix_parser, len(rows)) & kept
+        candidates = [candidate for candidate in candidates if candidate[0] not in unresolved]
+    else:
+        candidates, invalid_count = full_candidates(items[0])
+    returned_count = len(items[0])
+
+    logger.info(f"Successfully parsed {returned_count} contacts from LLM response")
+
+    # Standardize and validate the returned phones in one pass
+    valid_contacts = ContactTable()
+    ordinals = []
+    phones = standardize_phones([phone for _, _, phone in candidates])
+    for (idx, name, _), phone, valid in zip(candidates, phones, valid_phone_mask(phones)):
+        if valid:
+            row = rows[idx][0] if protocol == "compact" else rows[0][0]
+            valid_contacts.append(name, phone, STATUS_MODEL, row)
+            ordinals.append(idx)
+            logger.debug("Valid contact %s - Name: %s, Phone: %s", idx, name, phone)
+        else:
+            logger.debug("Invalid contact %s - Name: %s, Phone: %s", idx, name, phone)
+            invalid_count += 1
+
+    # Compact answers name their rows; full answers are matched back by phone
+    complete = True
+    if protocol != "compact":
+        matched = assign_contacts_to_rows(rows, valid_contacts)
+        complete = all(matched)
+        row_index = {pos: i for i, (pos, _, _) in enumerate(rows)}
+        anchors = [None] * parsers[0].items
+        for ordinal, is_matched, pos in zip(ordinals, matched, valid_contacts.rows):
+            if is_matched:
+                anchors[ordinal] = row_index[pos]
+        unresolved = unresolved_rows(anchors, parsers[0], len(rows)) - set(anchors)
+
+    # An empty answer is only trusted when it is complete and the local name rules reject every row too
+    all_rejected = not returned_count and not any(is_valid_name(name) for _, name, _ in rows)
+    if not valid_contacts and not unresolved and not all_rejected:
+        logger.warning("No valid contacts found in LLM response")
+        raise ValueError("No valid contacts found in LLM response")
+
+    logger.info(f"=== Chunk {chunk_idx} Complete ===")
+    logger.info(f"- Total contacts processed: {returned_count}")
+    logger.info(f"- Valid contacts: {len(valid_contacts)}")
+    logger.info(f"- Invalid contacts: {invalid_count}")
+    logger.info(f"- Unresolved rows: {len(unresolved)}")
+
+    memo_entries = []
+    if complete:
+        first_contacts = valid_contacts.first_by_row()
+        memo_entries = [
+            (ContactMemo.row_key(name, phone), first_contacts.get(pos))
+            for i, (pos, name, phone) in enumerate(rows)
+            if i not in unresolved
+        ]
+    else:
+        logger.info(f"Chunk {chunk_idx} has contacts that match no raw row, not memoizing it")
+    return valid_contacts, memo_entries, [rows[i] for i in sorted(unresolved)]
 
-        fallback_contacts = []
-        skipped_count = 0
+def manual_clean_rows(rows):
+    '''
+    Manually clean prepared (position, name, phone) rows, keeping those with a valid phone.
+    Applies the manual_clean_contact rules to the whole chunk at once.
+    Returns a ContactTable of the kept contacts with their row positions.
+    '''
+    contacts = ContactTable()
+    if not rows:
+        return contacts
+
+    positions, names, phones = zip(*rows)
+    cleaned_names = pd.Series(names, dtype=object).str.replace(TITLE_PATTERN, "", regex=True).str.strip()
+    cleaned_phones = standardize_phones(pd.Series(phones, dtype=object))
+    valid = valid_phone_mask(cleaned_phones)
+
+    for pos, cleaned_name, cleaned_phone, is_valid in zip(positions, cleaned_names, cleaned_phones, valid):
+        if is_valid:
+            contacts.append(cleaned_name, cleaned_phone, STATUS_MANUAL, pos)
+            logger.debug("Manually cleaned contact %s - Name: %s, Phone: %s", pos, cleaned_name, cleaned_phone)
+        else:
+            logger.debug("Skipped invalid contact %s - Name: %s, Phone: %s", pos, cleaned_name, cleaned_phone)
 
-        for idx, row in df.iterrows():
-            try:
-                name = str(row["Names"]).strip()
-                phone = str(row["Phone"]).strip()
-
-                cleaned_name, cleaned_phone = manual_clean_contact(name, phone)
-                if is_valid_phone(cleaned_phone):
-                    fallback_contacts.append({
-                        "name": cleaned_name,
-                        "phone": cleaned_phone
-                    })
-                    logger.info(f"Manually cleaned contact {idx} - Name: {cleaned_name}, Phone: {cleaned_phone}")
-                else:
-                    skipped_count += 1
-                    logger.info(f"Skipped invalid contact {idx} - Name: {cleaned_name}, Phone: {cleaned_phone}")
-
-            except Exception as row_error:
-                logger.warning(f"Could not clean row {idx}: {str(row_error)}")
-                skipped_count += 1
-
-        logger.info(f"Manual cleaning complete: {len(fallback_contacts)} valid contacts, {skipped_count} skipped")
-        return fallback_contacts
+    kept_count = int(valid.sum())
+    logger.info(f"Manual cleaning complete: {kept_count} valid contacts, {len(rows) - kept_count} skipped")
+    return contacts
 
 def manual_clean_contact(raw_name, raw_phone):
     '''
     A fallback function to manually clean a contact.
     '''
-    logger.info(f"Manual cleaning for: {raw_name}, {raw_phone}")
-    cleaned_name = re.sub(r"\b(Mr\.|Ms\.|Mrs\.)\s*", "", raw_name, flags=re.IGNORECASE).strip()
+    logger.debug("Manual cleaning for: %s, %s", raw_name, raw_phone)
+    cleaned_name = TITLE_PATTERN.sub("", raw_name).strip()
     cleaned_phone = raw_phone.strip()
     cleaned_phone = standardize_phone(cleaned_phone)
     return cleaned_name, cleaned_phone
@@ -329,58 +913,277 @@ def generate_vcard(name, phone):
         f"TEL:{phone}\n"
         "END:VCARD\n"
     )
-    logger.debug(f"Generated vCard for: {formatted_name}, {phone}")
+    logger.debug("Generated vCard for: %s, %s", formatted_name, phone)
     return vcard
 
-def generate_summary(df):
+def format_names(series):
+    '''
+    Series-level format_name: shortens names longer than 20 characters the same way.
+    '''
+    names = pd.Series(series, dtype=object)
+    long_names = names[names.str.len() > 20]
+    if long_names.empty:
+        return names
+
+    words = long_names.str.split()
+    candidate = words.str[:-1].str.join(" ") + " " + words.str[-1].str[0]
+    shortened = candidate.where(words.str.len() >= 2, long_names).str[:20]
+    names = names.copy()
+    names[shortened.index] = shortened
+    return names
+
+def exportable_contacts(df):
+    '''
+    Select the contacts that go into a VCF export.
+    Contacts with a missing or invalid phone or an invalid name are skipped, as are
+    later contacts reusing an exported phone.
+    '''
+    if isinstance(df, ContactTable):
+        df = df.to_frame()
+    if df.empty:
+        return pd.DataFrame(columns=["name", "phone"])
+    valid = (df["phone"] != "Missing") & valid_phone_mask(df["phone"]) & valid_name_mask(df["name"])
+    return df.loc[valid, ["name", "phone"]].drop_duplicates(subset="phone")
+
+def render_vcards(contacts):
+    '''
+    Render exportable contacts as a Series of vCard strings, as generate_vcard would.
+    '''
+    return (
+        "BEGIN:VCARD\nVERSION:3.0\nFN:" + format_names(contacts["name"])
+        + "\nTEL:" + contacts["phone"].astype(object) + "\nEND:VCARD\n"
+    )
+
+@timed_stage("generate_vcf")
+def generate_vcf(df):
+    '''
+    Serialize a cleaned contacts DataFrame or ContactTable into VCF bytes in one vectorized pass.
+    The output is identical to joining generate_vcard for each exported contact
+    with newlines. Returns empty bytes when there is no valid contact.
+    '''
+    contacts = exportable_contacts(df)
+    if contacts.empty:
+        return b""
+    logger.info(f"Generated VCF with {len(contacts)} vCards.")
+    return render_vcards(contacts).str.cat(sep="\n").encode("utf-8")
+
+def iter_vcf(contacts, chunk_size=VCF_CHUNK_SIZE):
+    '''
+    Yield the VCF of exportable contacts as byte chunks of chunk_size vCards.
+    Concatenated, the chunks equal generate_vcf's output, but only one chunk of
+    rendered text exists at a time.
+    '''
+    for start in range(0, len(contacts), chunk_size):
+        chunk = render_vcards(contacts.iloc[start:start + chunk_size]).str.cat(sep="\n")
+        yield (chunk if start == 0 else "\n" + chunk).encode("utf-8")
+
+@timed_stage("spool_vcf")
+def spool_vcf(df, part_size=0):
+    '''
+    Stream the VCF export into a temporary file on disk.
+    With a part_size, the contacts are split into VCF files of at most part_size
+    vCards each, bundled in a zip archive.
+    Returns the file's path and the number of exported contacts; the caller owns
+    the file and deletes it when done.
+    '''
+    contacts = exportable_contacts(df)
+    with tempfile.NamedTemporaryFile(prefix="contacts_", suffix=".zip" if part_size else ".vcf", delete=False) as f:
+        path = f.name
+        try:
+            if part_size:
+                with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                    for part, start in enumerate(range(0, len(contacts), part_size), start=1):
+                        with archive.open(f"contacts_{part:03d}.vcf", "w") as entry:
+                            for chunk in iter_vcf(contacts.iloc[start:start + part_size]):
+                                entry.write(chunk)
+            else:
+                for chunk in iter_vcf(contacts):
+                    f.write(chunk)
+        except Exception:
+            f.close()
+            os.remove(path)
+            raise
+    logger.info(f"Spooled VCF export with {len(contacts)} vCards (part size: {part_size or 'single file'}).")
+    return path, len(contacts)
+
+def contact_records(df):
+    '''
+    Convert a name/phone DataFrame into a list of {"name", "phone"} dicts.
+    '''
+    return [{"name": name, "phone": phone} for name, phone in zip(df["name"].tolist(), df["phone"].tolist())]
+
+def export_fingerprint(df):
+    '''
+    Fingerprint the VCF export of a cleaned contacts DataFrame or ContactTable.
+    Maps every exported phone to the name on its card, which is all a later
+    delta export needs; it can be stored as JSON instead of the VCF itself.
+    '''
+    return card_names(exportable_contacts(df))
+
+def card_names(contacts):
+    '''
+    Map the phones of exportable contacts to the names their vCards carry.
+    '''
+    return dict(zip(contacts["phone"].tolist(), format_names(contacts["name"]).tolist()))
+
+def fingerprint_json(fingerprint):
     '''
-    Generate a summary from the cleaned contacts DataFrame.
+    Serialize an export fingerprint to JSON bytes.
+    '''
+    return json.dumps(
+        {"version": FINGERPRINT_VERSION, "contacts": fingerprint}, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+def parse_vcf(text):
+    '''
+    Read the FN and TEL of every card in VCF text into a standardized phone -> name dict.
+    Cards without a phone are skipped; later cards win for a repeated phone.
+    '''
+    names, phones = [], []
+    for card in VCARD_PATTERN.findall(text):
+        name = phone = None
+        for line in card.splitlines():
+            key, _, value = line.partition(":")
+            key = key.split(";")[0].upper()
+            if key == "FN" and name is None:
+                name = value.strip()
+            elif key == "TEL" and phone is None:
+                phone = value.strip()
+        if phone:
+            names.append(name or "")
+            phones.append(phone)
+    return dict(zip(standardize_phones(phones).tolist(), names))
+
+def load_previous_export(data):
+    '''
+    Load a previous export as a phone -> name fingerprint.
+    Accepts a fingerprint JSON, a VCF file or a zip of VCF parts (see spool_vcf).
+    '''
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if data.startswith(ZIP_MAGIC):
+        fingerprint = {}
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for entry in sorted(archive.namelist()):
+                if entry.lower().endswith(".vcf"):
+                    fingerprint.update(parse_vcf(archive.read(entry).decode("utf-8", errors="replace")))
+        return fingerprint
+    text = data.decode("utf-8-sig", errors="replace")
+    if text.lstrip().startswith("{"):
+        document = json.loads(text)
+        if document.get("version") != FINGERPRINT_VERSION:
+            raise ValueError(f"Unsupported export fingerprint version: {document.get('version')}")
+        return document["contacts"]
+    return parse_vcf(text)
+
+@timed_stage("diff_export")
+def diff_export(previous, df):
+    '''
+    Compare the export of the cleaned contacts with a previous export's fingerprint.
+    Contacts are keyed by standardized phone and compared with set operations
+    on the dict keys. Returns a dict with the "added" and "changed" contacts
+    (name, phone; changed ones also previous_name), their union in export order
+    as "delta", the "removed" ones (name, phone) and the current "fingerprint".
+    '''
+    contacts = exportable_contacts(df)
+    fingerprint = card_names(contacts)
+    added = fingerprint.keys() - previous.keys()
+    removed = previous.keys() - fingerprint.keys()
+    changed = {phone for phone in fingerprint.keys() & previous.keys() if fingerprint[phone] != previous[phone]}
+
+    phones = contacts["phone"]
+    changed_contacts = contacts[phones.isin(list(changed))].assign(
+        previous_name=lambda frame: frame["phone"].map(previous)
+    )
+    removed_contacts = pd.DataFrame(
+        [(previous[phone], phone) for phone in previous if phone in removed],
+        columns=["name", "phone"]
+    )
+    logger.info(f"Export diff: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+    return {
+        "added": contacts[phones.isin(list(added))].reset_index(drop=True),
+        "changed": changed_contacts.reset_index(drop=True),
+        "delta": contacts[phones.isin(list(added | changed))].reset_index(drop=True),
+        "removed": removed_contacts,
+        "fingerprint": fingerprint
+    }
+
+def generate_delta_vcf(diff):
+    '''
+    Serialize only the added and changed contacts of an export diff into VCF bytes.
+    Importing it on top of the previous export updates the changed cards instead
+    of re-importing every contact. Returns empty bytes when nothing is new.
+    '''
+    contacts = diff["delta"]
+    if contacts.empty:
+        return b""
+    logger.info(f"Generated delta VCF with {len(contacts)} vCards.")
+    return render_vcards(contacts).str.cat(sep="\n").encode("utf-8")
+
+@timed_stage("generate_summary")
+def generate_summary(df, as_frames=False):
+    '''
+    Generate a summary from the cleaned contacts DataFrame or ContactTable.
     This function uses the batch processed data.
+    Duplicates are found with a single duplicated() pass over the phones.
+    When the contacts carry a "source" column, as merged uploads from parse_files
+    do, each duplicate entry also names the files its contacts came from.
+    With as_frames, the potentially large "unique_contacts" and "different_area_codes"
+    entries are DataFrames and "missing_phone_numbers" is a Series, instead of lists,
+    so callers only materialize what they display.
     '''
     logger.info("Generating summary from batch processed data.")
+    if isinstance(df, ContactTable):
+        df = df.to_frame()
+    if df.empty:
+        df = pd.DataFrame(columns=["name", "phone"], dtype=object)
     total_rows = len(df)
-    contacts_summary = df.to_dict("records")
-    valid_contacts = [(row["name"], row["phone"]) for row in contacts_summary if row["phone"] != "Missing" and is_valid_phone(row["phone"])]
-    total_valid = len(valid_contacts)
-    phone_list = [phone for _, phone in valid_contacts]
-    unique_phones = set(phone_list)
-    unique_count = len(unique_phones)
-
-    duplicate_summary = {}
-    non_unique_contacts = []
-    for phone, count in Counter(phone_list).items():
-        if count > 1:
-            names = [name for name, p in valid_contacts if p == phone]
-            duplicate_summary[phone] = {"first_name": names[0], "duplicates": names[1:]}
-            non_unique_contacts.extend(names)
-    non_unique_contacts = list(set(non_unique_contacts))
-
-    seen = {}
-    final_contacts = []
-    for entry in contacts_summary:
-        phone = entry["phone"]
-        name = entry["name"]
-        if phone != "Missing":
-            if phone not in seen:
-                final_contacts.append({"name": name, "phone": phone})
-                seen[phone] = 1
-            else:
-                final_contacts.append({"name": name, "phone": "Missing"})
-                seen[phone] += 1
-        else:
-            final_contacts.append({"name": name, "phone": "Missing"})
-
-    different_area_codes = []
-    for name, phone in valid_contacts:
-        if not is_turkish_mobile(phone):
-            different_area_codes.append({"name": name, "phone": phone})
+    names = df["name"]
+    phones = df["phone"]
+
+    present = phones != "Missing"
+    valid = (present & valid_phone_mask(phones)).to_numpy()
+    valid_contacts = df.loc[valid, ["name", "phone"]]
+    valid_phones = valid_contacts["phone"]
+
+    # Every valid contact sharing its phone with another one, grouped in row order
+    shared_mask = valid_phones.duplicated(keep=False).to_numpy()
+    shared = valid_contacts[shared_mask]
+    duplicate_groups = {}
+    for phone, name in zip(shared["phone"].tolist(), shared["name"].tolist()):
+        duplicate_groups.setdefault(phone, []).append(name)
+    duplicate_summary = {
+        phone: {"first_name": group[0], "duplicates": group[1:]}
+        for phone, group in duplicate_groups.items()
+    }
+    if "source" in df:
+        source_groups = {}
+        shared_sources = df["source"].to_numpy()[valid][shared_mask]
+        for phone, source in zip(shared["phone"].tolist(), shared_sources.tolist()):
+            source_groups.setdefault(phone, []).append(source)
+        for phone, group in source_groups.items():
+            duplicate_summary[phone]["first_source"] = group[0]
+            duplicate_summary[phone]["duplicate_sources"] = group[1:]
+    non_unique_contacts = list(dict.fromkeys(shared["name"].tolist()))
+
+    # Only the first row with a phone keeps it, later ones are reported as missing
+    final_phones = phones.where(present & ~phones.duplicated(), "Missing")
+    final_contacts = pd.DataFrame({"name": names, "phone": final_phones}).reset_index(drop=True)
+    missing_phone_numbers = final_contacts.loc[final_contacts["phone"] == "Missing", "name"].reset_index(drop=True)
+
+    different_area_codes = valid_contacts[(phone_line_types(valid_phones) != MOBILE).to_numpy()].reset_index(drop=True)
+
+    if not as_frames:
+        final_contacts = contact_records(final_contacts)
+        missing_phone_numbers = missing_phone_numbers.tolist()
+        different_area_codes = contact_records(different_area_codes)
 
     summary = {
         "total_rows": total_rows,
-        "total_valid_contacts": total_valid,
-        "unique_phone_numbers": unique_count,
+        "total_valid_contacts": len(valid_contacts),
+        "unique_phone_numbers": int(valid_phones.nunique()),
         "total_rooms": 0,  # This could be updated if room information is needed
-        "missing_phone_numbers": [entry["name"] for entry in final_contacts if entry["phone"] == "Missing"],
+        "missing_phone_numbers": missing_phone_numbers,
         "duplicate_phone_numbers": duplicate_summary,
         "non_unique_contacts": non_unique_contacts,
         "unique_contacts": final_contacts,
@@ -392,50 +1195,24 @@ def generate_summary(df):
 def is_valid_phone(phone):
     '''
     Check if the phone number is valid.
-    A valid phone should be in the format: +90 followed by exactly 10 digits.
+    A valid phone is a country code of phone_regions.json followed by a national
+    number of a valid length for it, e.g. +90 followed by exactly 10 digits.
     '''
-    return bool(re.fullmatch(r"\+90\d{10}", phone))
+    return phone_normalizer.is_valid(phone)
 
 def is_valid_name(name):
     '''
     Check if the name is valid.
     A valid name should contain at least two words and not contain irrelevant keywords or patterns.
+    The keywords are shared with the preprocessing row filter, see filter_rules.json.
     '''
-    name_lower = name.lower()
+    return rule_matcher.name_reason(name) == KEEP
 
-    # Must have at least two words
-    if len(name.split()) < 2:
-        return False
-
-    # Check for parentheses (often contains location codes)
-    if '(' in name or ')' in name:
-        return False
-
-    # List of invalid keywords
-    irrelevant_keywords = [
-        # Locations and Travel
-        "hotel", "flight", "brickell", "address", "conference", "airport",
-        "miami", "new york", "nyc", "las vegas", "los angeles", "san francisco",
-        "city", "town", "street", "ave", "avenue", "road", "blvd",
-
-        # Business and Groups
-        "vouchers", "group", "office", "booking", "reservation",
-        "tour", "guide", "leader", "manager",
-
-        # Common city codes
-        "mia", "nyc", "sfo", "lax", "las", "orl",
-
-        # Conjunctions that might indicate multiple people
-        " and ", " & "
-    ]
-
-    # Check for any irrelevant keywords
-    for keyword in irrelevant_keywords:
-        if keyword in name_lower:
-            return False
-
-    # All checks passed
-    return True
+def valid_name_mask(series):
+    '''
+    Series-level is_valid_name: a boolean mask of the valid contact names.
+    '''
+    return rule_matcher.name_reasons(series) == KEEP
 
 def is_valid_contact(name, phone):
     '''
@@ -443,18 +1220,111 @@ def is_valid_contact(name, phone):
     '''
     return is_valid_phone(phone) and is_valid_name(name)
 
-def parse_excel(file):
+def expand_uploads(uploads):
+    '''
+    Flatten uploaded (file name, bytes) pairs into the contact files they hold.
+    The supported files inside a zip archive are returned as "archive.zip/member"
+    entries; Excel workbooks, which are zip files too, are kept whole.
+    '''
+    files = []
+    for file_name, data in uploads:
+        if data.startswith(ZIP_MAGIC):
+            try:
+                with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                    members = archive.namelist()
+                    if "[Content_Types].xml" not in members:
+                        for member in members:
+                            base = os.path.basename(member)
+                            hidden = member.startswith("__MACOSX/") or base.startswith(".")
+                            if hidden or not base.lower().endswith(UPLOAD_EXTENSIONS):
+                                logger.info(f"Skipping {member} in {file_name}")
+                                continue
+                            files.append((f"{file_name}/{member}", archive.read(member)))
+                        continue
+            except zipfile.BadZipFile:
+                pass
+        files.append((file_name, data))
+    return files
+
+def merge_contact_frames(frames, sources):
+    '''
+    Concatenate cleaned contact frames, tagging each contact with its "source" file.
+    '''
+    frames = [frame.assign(source=source) for frame, source in zip(frames, sources) if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["name", "phone", "source"], dtype=object)
+    return pd.concat(frames, ignore_index=True)
+
+def clean_frame(raw_df):
+    '''
+    Clean the preprocessed rows of one file into a name/phone DataFrame.
+    '''
+    return process_contacts_bulk(raw_df).to_frame()
+
+@timed_stage("parse_files")
+def parse_files(uploads, workers=None, file_concurrency=FILE_CONCURRENCY):
+    '''
+    Parse several uploads, zip archives included, into one DataFrame of cleaned contacts.
+    A single file is parsed like parse_excel. Several files are preprocessed in a
+    process pool and each one is cleaned on a thread pool as soon as it is read;
+    their model calls share the model wrapper's concurrency budget. Contacts keep
+    the upload order and get a "source" column naming their file, so the
+    duplicates generate_summary finds across files can be traced back to them.
+    '''
+    logger.info(f"Starting parsing of {len(uploads)} upload(s).")
+    try:
+        files = expand_uploads(uploads)
+        if not files:
+            raise ValueError("No contact files found in the upload")
+        sources = [file_name for file_name, _ in files]
+        if len(files) == 1:
+            return merge_contact_frames([parse_excel(io.BytesIO(files[0][1]))], sources)
+
+        workers = min(workers or os.cpu_count() or 1, len(files))
+        logger.info(f"Parsing {len(files)} files with {workers} parser process(es)")
+        parser_context = multiprocessing.get_context(PROCESS_START_METHOD)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=parser_context) as parsers, \
+                ThreadPoolExecutor(max_workers=file_concurrency) as cleaners:
+            parse_futures = {
+                parsers.submit(preprocess_excel, io.BytesIO(data)): index
+                for index, (_, data) in enumerate(files)
+            }
+            clean_futures = {}
+            for future in as_completed(parse_futures):
+                index = parse_futures[future]
+                try:
+                    raw_df = future.result()
+                except Exception as e:
+                    raise ValueError(f"Could not parse {sources[index]}: {str(e)}") from e
+                clean_futures[index] = cleaners.submit(clean_frame, raw_df)
+            frames = [clean_futures[index].result() for index in range(len(files))]
+
+        result_df = merge_contact_frames(frames, sources)
+        logger.info(f"Merged {len(result_df)} contacts from {len(files)} files.")
+        return result_df
+    except Exception as e:
+        logger.error(f"Error in parse_files: {str(e)}")
+        raise
+
+@timed_stage("parse_excel")
+def parse_excel(file, sheets=None):
     '''
-    Parse and process the Excel file using batch processing.
+    Parse and process an Excel, CSV, TSV or Parquet file using batch processing.
+    Rows are cleaned chunk by chunk while the workbook is still being read; the
+    source rows of each chunk's contacts are offset by the rows read before it.
     Returns a DataFrame of cleaned contacts with columns "name" and "phone".
     '''
     logger.info("Starting Excel parsing for batch processing.")
     try:
-        df_raw = preprocess_excel(file)
-        cleaned_contacts = process_contacts_bulk(df_raw)
-        result_df = pd.DataFrame(cleaned_contacts)
+        cleaned_contacts = ContactTable()
+        offset = 0
+        for df_raw in preprocess_excel_chunks(file, sheets):
+            if not df_raw.empty:
+                cleaned_contacts.extend(process_contacts_bulk(df_raw), row_offset=offset)
+            offset += len(df_raw)
+        result_df = cleaned_contacts.to_frame()
         logger.info(f"Successfully processed {len(result_df)} contacts in bulk.")
         return result_df
     except Exception as e:
         logger.error(f"Error in parse_excel: {str(e)}")
-        raise
\ No newline at end of file
+        raise